@@ -0,0 +1,291 @@
+# bench/run_bench.py
+"""
+离线基准：用 bench/fixtures 下录好的页面和合成数据，测各热点函数的吞吐和峰值内存。
+
+用法：
+    python bench/run_bench.py                          # 先做一致性检查，再跑全部
+    python bench/run_bench.py --only amazon_parse_xpath,best_prices --sizes 10,1000
+    python bench/run_bench.py --save bench/baseline.json
+    python bench/run_bench.py --compare bench/baseline.json
+"""
+from __future__ import annotations
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_SIZES = [10, 100, 1_000, 10_000, 100_000]
+PAGE_MAX = 1_000            # 解析类基准的页面/条目数上限（再大就是在测磁盘和内存了）
+
+MODELS = ["OLED55C4", "OLED65C4", "OLED55B4", "OLED65B4"]
+SITES = ["Amazon", "LG", "Smiths"]
+
+
+def fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+# ---------------- 合成数据 ----------------
+def synth_titles(n: int) -> list[str]:
+    rnd = random.Random(n)
+    base = [
+        "LG OLED65C46LA 65 inch 4K OLED evo Smart TV",
+        "LG OLED55B46LA 55\" B4 OLED Smart TV",
+        "TV Wall Mount Bracket for LG OLED65C4",
+        "Samsung QE65S90D 65 inch OLED TV",
+        "LG OLED48C44LA 48 inch C4 OLED evo",
+        "LG OLED65B4 65-inch OLED 4K Smart TV (2024)",
+    ]
+    return [f"{rnd.choice(base)} #{i}" for i in range(n)]
+
+
+def synth_rows(n: int) -> list[dict]:
+    rnd = random.Random(n)
+    rows = []
+    for i in range(n):
+        site = SITES[i % len(SITES)]
+        model = MODELS[(i // len(SITES)) % len(MODELS)]
+        price = rnd.choice([f"£{rnd.randint(600, 2000)}.{rnd.randint(0, 99):02d}",
+                            f"£{rnd.randint(1, 2)},{rnd.randint(0, 999):03d}.00",
+                            "N/A", None])
+        rows.append({
+            "site": site,
+            "model": model,
+            "price": price,
+            "title": f"LG {model} OLED TV #{i}",
+            "url": f"https://example.test/{site.lower()}/{model.lower()}/{i}",
+            "in_stock": price not in (None, "N/A") and rnd.random() > 0.2,
+        })
+    return rows
+
+
+def scaled_amazon_page(n: int) -> str:
+    """把 fixture 里的搜索结果复制到 n 条，外壳不变。"""
+    html = fixture("amazon_search_oled_c4.html")
+    marker = '<div role="listitem"'
+    head, _, rest = html.partition(marker)
+    body, tail_marker, tail = rest.rpartition('</div></span></div></div></div></span></div>')
+    items = [marker + chunk for chunk in body.split(marker)]
+    reps = (items * (n // len(items) + 1))[:n]
+    return head + "".join(reps) + tail_marker + tail
+
+
+# ---------------- 基准定义：setup(n) -> (被测无参函数, 实际处理条数)；准备工作不计时 ----------------
+def bench_amazon_parse(mode: str):
+    def setup(n: int):
+        from scrapers import amazon
+        html = scaled_amazon_page(min(n, PAGE_MAX))
+
+        def run():
+            amazon.PARSER_MODE = mode
+            amazon._parse_search_items(html, "OLED65C4")
+        return run, min(n, PAGE_MAX)
+    return setup
+
+
+def bench_lg_jsonld(fast: bool):
+    def setup(n: int):
+        from bs4 import BeautifulSoup
+        from scrapers import lg
+        pages = [fixture("lg_oled65c4.html"), fixture("lg_oled55b4.html")]
+        pages = (pages * (min(n, PAGE_MAX) // 2 + 1))[:min(n, PAGE_MAX)]
+
+        if fast:
+            return (lambda: [lg.fast_extract_jsonld_price(p) for p in pages]), len(pages)
+        return (lambda: [lg.extract_jsonld_price(BeautifulSoup(p, "lxml")) for p in pages]), len(pages)
+    return setup
+
+
+def bench_smiths_sf_layer(fast: bool):
+    def setup(n: int):
+        from bs4 import BeautifulSoup
+        from scrapers import smiths
+        pages = [fixture("smiths_oled65c4.html")] * min(n, PAGE_MAX)
+
+        if fast:
+            return (lambda: [smiths.fast_extract_sf_layer_price(p) for p in pages]), len(pages)
+        return (lambda: [smiths.extract_sf_layer_price(BeautifulSoup(p, "lxml")) for p in pages]), len(pages)
+    return setup
+
+
+def setup_looks_like_target(n: int):
+    from utils.filters import looks_like_target
+    titles = synth_titles(n)
+    return (lambda: [looks_like_target(t, "OLED65C4") for t in titles]), n
+
+
+def setup_render_and_save(n: int):
+    from utils.report import render_and_save
+    rows = synth_rows(n)
+    outdir = tempfile.mkdtemp(prefix="bench-report-")
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            render_and_save(rows, outdir=outdir)
+    return run, n
+
+
+def setup_normalize_frame(n: int):
+    from utils.report import normalize_frame
+    rows = synth_rows(n)
+    return (lambda: normalize_frame(rows)), n
+
+
+def legacy_normalize_frame(rows: list[dict]):
+    """改成 PriceObservation 之前的 normalize_frame：dict 行 -> DataFrame -> 向量化解析价格 -> 去重。"""
+    import pandas as pd
+    df = pd.DataFrame(rows, columns=["site", "model", "price", "title", "url", "in_stock"])
+    num = pd.to_numeric(df["price"], errors="coerce")
+    text = df["price"].astype("string").str.extract(r"([\d,.]+)", expand=False).str.replace(",", "", regex=False)
+    df["price_num"] = num.fillna(pd.to_numeric(text, errors="coerce")).astype("float64")
+    df = df.drop_duplicates(subset=["site", "url"], keep="first")
+    df["site"] = df["site"].astype("category")
+    df["model"] = df["model"].astype("category")
+    return df
+
+
+def setup_cycle_dicts(n: int):
+    """一轮的旧路径：scraper 的 dict 行 -> collect_all_rows 再拷一份 dict -> DataFrame。"""
+    raw = synth_rows(n)
+
+    def run():
+        rows = [{"site": r["site"], "model": r["model"], "price": r["price"], "title": r["title"],
+                 "in_stock": r["in_stock"], "url": r["url"]} for r in raw]
+        return legacy_normalize_frame(rows)
+    return run, n
+
+
+def setup_cycle_observations(n: int):
+    """一轮的新路径：scraper 直接产出 PriceObservation（价格已解析）-> 按列建 DataFrame。"""
+    from utils.observation import PriceObservation
+    from utils.report import normalize_frame
+    raw = synth_rows(n)
+
+    def run():
+        rows = [PriceObservation.make(r["site"], r["model"], r["price"], r["title"], r["url"], r["in_stock"])
+                for r in raw]
+        return normalize_frame(rows)
+    return run, n
+
+
+def setup_best_prices(n: int):
+    from utils.report import normalize_frame
+    from utils.notify import best_prices
+    df = normalize_frame(synth_rows(n))
+    return (lambda: best_prices(df)), n
+
+
+BENCHES = {
+    "amazon_parse_xpath": bench_amazon_parse("xpath"),
+    "amazon_parse_soup": bench_amazon_parse("soup"),
+    "lg_jsonld_fast": bench_lg_jsonld(True),
+    "lg_jsonld_dom": bench_lg_jsonld(False),
+    "smiths_sf_layer_fast": bench_smiths_sf_layer(True),
+    "smiths_sf_layer_dom": bench_smiths_sf_layer(False),
+    "looks_like_target": setup_looks_like_target,
+    "normalize_frame": setup_normalize_frame,
+    "render_and_save": setup_render_and_save,
+    "best_prices": setup_best_prices,
+    "cycle_rows_dicts": setup_cycle_dicts,
+    "cycle_rows_observations": setup_cycle_observations,
+}
+
+
+# ---------------- 一致性检查（快速路径 vs DOM 路径） ----------------
+def check_parity() -> list[str]:
+    from scrapers import amazon, lg, smiths
+    errors = []
+
+    for name in ["lg_oled65c4.html", "lg_oled55b4.html"]:
+        html = fixture(name)
+        fast, dom = lg._parse_page_fast(html), lg._parse_page_dom(html, "?")
+        if fast != dom:
+            errors.append(f"lg {name}: fast={fast!r} dom={dom!r}")
+
+    html = fixture("smiths_oled65c4.html")
+    fast, dom = smiths._parse_page_fast(html), smiths._parse_page_dom(html, "?")
+    if fast != dom:
+        errors.append(f"smiths: fast={fast!r} dom={dom!r}")
+
+    html = fixture("amazon_search_oled_c4.html")
+    mode = amazon.PARSER_MODE
+    try:
+        out = {}
+        for m in ("xpath", "soup"):
+            amazon.PARSER_MODE = m
+            out[m] = amazon._parse_all_items(html)
+    finally:
+        amazon.PARSER_MODE = mode
+    if out["xpath"] != out["soup"]:
+        errors.append("amazon: xpath and soup parsers disagree")
+    return errors
+
+
+# ---------------- 计时 / 内存 ----------------
+def measure(run, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"sec": best, "peak_kb": peak / 1024}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="offline benchmarks for the scraper hot paths")
+    ap.add_argument("--only", help="逗号分隔的基准名")
+    ap.add_argument("--sizes", help="逗号分隔的规模，默认 10..100000")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--save", help="把结果存为基线 JSON")
+    ap.add_argument("--compare", help="与基线 JSON 对比")
+    ap.add_argument("--skip-check", action="store_true", help="跳过快速路径一致性检查")
+    args = ap.parse_args()
+
+    if not args.skip_check:
+        errors = check_parity()
+        for e in errors:
+            print(f"[PARITY] {e}")
+        if errors:
+            sys.exit(1)
+        print("[PARITY] ok")
+
+    names = args.only.split(",") if args.only else list(BENCHES)
+    sizes = [int(x) for x in args.sizes.split(",")] if args.sizes else DEFAULT_SIZES
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else {}
+
+    results: dict[str, dict[str, dict]] = {}
+    print(f"{'bench':<24}{'n':>8}{'sec':>12}{'items/s':>14}{'peak KiB':>12}{'vs base':>10}")
+    for name in names:
+        setup = BENCHES[name]
+        for n in sizes:
+            run, count = setup(n)
+            r = measure(run, args.repeat)
+            r["n"] = count
+            results.setdefault(name, {})[str(n)] = r
+            base = baseline.get(name, {}).get(str(n))
+            ratio = f"{base['sec'] / r['sec']:.2f}x" if base and r["sec"] else "-"
+            print(f"{name:<24}{count:>8}{r['sec']:>12.5f}{count / r['sec'] if r['sec'] else 0:>14.0f}"
+                  f"{r['peak_kb']:>12.0f}{ratio:>10}")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nSaved baseline -> {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# bench/startup_bench.py
+"""
+冷启动基准：用 `python -X importtime` 测 main.py --once 在“被跳过”时的导入开销。
+
+两种被跳过的场景（cron 下最常见）：
+- lock      另一个实例持有 .run.lock
+- offhours  不在活跃时段（RUN_HOUR_START/END 设成一个不可能的区间）
+
+用法：
+    python bench/startup_bench.py                 # 两种场景各跑 5 次
+    python bench/startup_bench.py --runs 10 --top 20
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+HEAVY = ("pandas", "numpy", "bs4", "lxml", "requests", "urllib3", "rich")
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """解析 -X importtime 输出：[(模块, 累计微秒, 嵌套深度)]。"""
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue            # 表头
+        raw = parts[2]
+        out.append((raw.strip(), int(parts[1]), len(raw) - len(raw.lstrip(" "))))
+    return out
+
+
+def run_once(scenario: str) -> tuple[float, list[tuple[str, int, int]]]:
+    env = dict(os.environ)
+    if scenario == "offhours":
+        env["RUN_HOUR_START"], env["RUN_HOUR_END"] = "25", "25"
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "main.py", "--once"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    return time.perf_counter() - t0, parse_importtime(proc.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="cold-start benchmark for main.py --once")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10)
+    args = ap.parse_args()
+
+    from filelock import FileLock
+
+    for scenario in ("lock", "offhours"):
+        walls, mods = [], []
+        if scenario == "lock":
+            lock = FileLock(str(ROOT / ".run.lock"))
+            lock.acquire()
+        try:
+            for _ in range(args.runs):
+                wall, mods = run_once(scenario)
+                walls.append(wall)
+        finally:
+            if scenario == "lock":
+                lock.release()
+
+        top_depth = min((d for _, _, d in mods), default=0)
+        top = [(n, c) for n, c, d in mods if d == top_depth]
+        heavy = sorted({n.split(".")[0] for n, _, _ in mods if n.split(".")[0] in HEAVY})
+        total_ms = sum(c for _, c in top) / 1000
+        print(f"\n== {scenario}: wall median {statistics.median(walls) * 1000:.0f} ms "
+              f"(min {min(walls) * 1000:.0f}), imports {total_ms:.0f} ms")
+        print(f"   heavy modules loaded: {', '.join(heavy) or 'none'}")
+        for name, cum in sorted(top, key=lambda x: -x[1])[:args.top]:
+            print(f"   {cum / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,44 @@
 # config.py
-THRESHOLDS = {
-    "OLED55C4":  999,   # 严格小于才触发
-    "OLED65C4": 1300,
-    "OLED55B4":  750,
-    "OLED65B4":  850,
+# 商品目录：唯一需要维护型号的地方。
+#   threshold  告警阈值（严格小于才触发）
+#   sites      各站点怎么抓：LG / Smiths 是固定链接 url；Amazon 按 query 搜索，
+#              group 相同的型号合并成一次搜索（见 scrapers.amazon.scrape_many）
+# 某站点不卖的型号就不写该站点，调度时不会为它发请求。
+PRODUCTS = {
+    "OLED55C4": {
+        "threshold": 999,
+        "sites": {
+            "Amazon": {"query": "OLED55C4", "group": "LG OLED C4"},
+            "LG":     {"url": "https://www.lg.com/uk/tvs-soundbars/oled-evo/oled55c46la/"},
+            "Smiths": {"url": "https://www.smithstv.co.uk/lg-oled55c46la-1000007338.html"},
+        },
+    },
+    "OLED65C4": {
+        "threshold": 1300,
+        "sites": {
+            "Amazon": {"query": "OLED65C4", "group": "LG OLED C4"},
+            "LG":     {"url": "https://www.lg.com/uk/tvs-soundbars/oled-evo/oled65c46la/"},
+            "Smiths": {"url": "https://www.smithstv.co.uk/lg-oled65c46la-1000007326.html"},
+        },
+    },
+    "OLED55B4": {
+        "threshold": 750,
+        "sites": {
+            "Amazon": {"query": "OLED55B4", "group": "LG OLED B4"},
+            "LG":     {"url": "https://www.lg.com/uk/tvs-soundbars/oled/oled55b4ela/"},
+        },
+    },
+    "OLED65B4": {
+        "threshold": 850,
+        "sites": {
+            "Amazon": {"query": "OLED65B4", "group": "LG OLED B4"},
+            "LG":     {"url": "https://www.lg.com/uk/tvs-soundbars/oled/oled65b4ela/"},
+        },
+    },
 }
 
+THRESHOLDS = {model: p["threshold"] for model, p in PRODUCTS.items()}
+
 # 邮件发送配置（建议用环境变量）
 SMTP_HOST = "smtp.gmail.com"
 SMTP_PORT = 587
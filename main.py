@@ -4,16 +4,16 @@ import time
 import random
 import argparse
 import logging
+import importlib
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from pathlib import Path
 
-from filelock import FileLock, Timeout
-from dotenv import load_dotenv
-
-from scrapers import amazon, lg, smiths
-from utils.report import render_and_save
-from utils.notify import check_and_notify
+# 只在顶层导入标准库和轻量模块：cron 下的 --once 大多在拿锁/活跃时段检查时就退出了，
+# pandas / bs4 / lxml / requests 等重模块在第一次用到时才导入（见各函数内的 import）。
+from utils.metrics import METRICS
+from utils.deadline import DeadlineExceeded, cycle_deadline, time_left
+from utils.observation import PriceObservation
 
 # ---------------- 配置（可被 .env 覆盖） ----------------
 DEFAULT_RUN_INTERVAL_MIN = 20          # 运行间隔（分钟）
@@ -21,8 +21,12 @@ DEFAULT_RUN_HOUR_START   = 9           # 活跃时段起始整点（含）
 DEFAULT_RUN_HOUR_END     = 23          # 活跃时段结束整点（含）
 DEFAULT_JITTER_SEC_MIN   = 0           # 每轮执行前的随机抖动（秒）
 DEFAULT_JITTER_SEC_MAX   = 120
+DEFAULT_FETCH_MODE       = "serial"    # serial | concurrent | pipeline
+DEFAULT_CYCLE_DEADLINE_SEC = 15 * 60   # 每轮（含抖动）的时间预算，到点后剩下的目标跳过；0 表示不限
+JITTER_MAX_SHARE         = 0.5         # 抖动最多占用预算的比例，至少留一半给抓取
 
 LOCK_FILE = ".run.lock"                # 防止并发
+REPLAY_DIR = os.getenv("REPLAY_DIR", "reports/replay")   # --replay 的报告和指标写到这里，不碰线上的 reports/
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
 # ---------------- 日志 ----------------
@@ -33,86 +37,603 @@ if not logger.handlers:
     logger.addHandler(h)
 logger.setLevel(LOG_LEVEL)
 
-model_list = ["OLED55C4", "OLED65C4", "OLED55B4", "OLED65B4"]
-
+# 型号和各站点的链接/搜索词统一在 config.PRODUCTS（经 utils.catalog 索引）
+# "模块:函数"，第一次调用时才导入
 scrapers = {
-    "Amazon": amazon.scrape,
-    "LG": lg.scrape,
-    "Smiths": smiths.scrape,
+    "Amazon": "scrapers.amazon:scrape",
+    "LG": "scrapers.lg:scrape",
+    "Smiths": "scrapers.smiths:scrape",
+}
+
+# 支持批量抓取的站点：一次调用服务所有型号，返回 {model: rows}
+batch_scrapers = {
+    "Amazon": "scrapers.amazon:scrape_many",
 }
 
-def collect_all_rows() -> list[dict]:
-    all_rows = []
-    for model in model_list:
-        for site, func in scrapers.items():
+# 并发模式下每个站点同时在途的请求上限（不同站点之间并行）
+SITE_CONCURRENCY = {
+    "Amazon": 1,
+    "LG": 2,
+    "Smiths": 2,
+}
+
+def _normalize_rows(site: str, model: str, rows: list) -> list[PriceObservation]:
+    # scraper 直接产出 PriceObservation，原样通过；旧式行 dict 才转换一次（站点名以调度里的为准）
+    return [r if isinstance(r, PriceObservation) else PriceObservation.from_dict(r, site=site, model=model)
+            for r in rows]
+
+
+def _resolve(spec: str):
+    module, func = spec.split(":")
+    return getattr(importlib.import_module(module), func)
+
+
+def all_jobs() -> list[tuple[str, str]]:
+    """目录里全部有效的 (site, model) 目标，按 model × site 的顺序；站点不卖的型号不出现。"""
+    from utils.catalog import CATALOG
+    return CATALOG.jobs(scrapers)
+
+
+def _run_job(site: str, model: str) -> list[PriceObservation] | None:
+    """失败返回 None（区别于“抓到 0 条”）；本轮预算用完时抛 DeadlineExceeded。"""
+    try:
+        rows = _resolve(scrapers[site])(model)  # [PriceObservation, ...]（旧式 scraper 可以返回行 dict）
+        return _normalize_rows(site, model, rows)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"[{site}] {model} failed: {e}")
+        return None
+
+
+def _run_batch(site: str, models: list[str]) -> dict[str, list[PriceObservation] | None]:
+    """
+    批量抓取：{model: rows | None}，None 表示失败。
+    本轮预算中途用完时只返回已抓到的型号，没抓的不在结果里（记为跳过，不算失败）。
+    """
+    try:
+        batch = _resolve(batch_scrapers[site])(models)
+        return {m: _normalize_rows(site, m, batch[m]) for m in models if m in batch}
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"[{site}] batch {', '.join(models)} failed: {e}")
+        return {m: None for m in models}
+
+
+def _batch_groups(jobs: list[tuple[str, str]]) -> dict[str, list[str]]:
+    groups: dict[str, list[str]] = {}
+    for site, model in jobs:
+        if site in batch_scrapers:
+            groups.setdefault(site, []).append(model)
+    return groups
+
+
+def _collect_serial(jobs: list[tuple[str, str]], emit) -> dict[tuple[str, str], list[PriceObservation] | None]:
+    results = {}
+    for site, models in _batch_groups(jobs).items():
+        try:
+            batch = _run_batch(site, models)
+        except DeadlineExceeded:
+            continue
+        for model in models:
+            if model in batch:
+                results[(site, model)] = batch[model]
+                emit((site, model), results[(site, model)])
+    for site, model in jobs:
+        if site in batch_scrapers:
+            continue
+        try:
+            results[(site, model)] = _run_job(site, model)
+        except DeadlineExceeded:
+            continue
+        emit((site, model), results[(site, model)])
+    return results
+
+
+def _collect_concurrent(jobs: list[tuple[str, str]], emit) -> dict[tuple[str, str], list[PriceObservation] | None]:
+    """
+    每个站点一个线程池（大小 = SITE_CONCURRENCY），站点之间并行、站点内限流。
+    谁先抓完谁先 emit（在调用线程里）。
+    """
+    sites = {site for site, _ in jobs}
+    pools = {site: ThreadPoolExecutor(max_workers=max(1, SITE_CONCURRENCY.get(site, 1)),
+                                      thread_name_prefix=f"fetch-{site}")
+             for site in sites}
+    try:
+        groups = _batch_groups(jobs)
+        futures = {pools[site].submit(_run_batch, site, models): (site, models, True)
+                   for site, models in groups.items()}
+        futures.update({pools[site].submit(_run_job, site, model): (site, [model], False)
+                        for site, model in jobs if site not in groups})
+        results = {}
+        for fut in as_completed(futures):
+            site, models, batch = futures[fut]
             try:
-                rows = func(model)              # [{'model','price','title','url',...}]
-                for r in rows:
-                    # 统一字段并补上站点名
-                    all_rows.append({
-                        "site": site,
-                        "model": r.get("model") or model,
-                        "price": r.get("price"),
-                        "title": r.get("title"),
-                        "in_stock": r.get("in_stock"),
-                        "url": r.get("url"),
-                    })
-            except Exception as e:
-                print(f"[{site}] {model} failed: {e}")
-    return all_rows
+                out = fut.result()
+            except DeadlineExceeded:
+                continue
+            for model in models:
+                if batch and model not in out:
+                    continue                          # 批量抓取中途到了截止时间，没抓的型号算跳过
+                results[(site, model)] = out[model] if batch else out
+                emit((site, model), results[(site, model)])
+        return results
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _collect_pipeline(jobs: list[tuple[str, str]], emit) -> dict[tuple[str, str], list[PriceObservation] | None]:
+    """
+    抓取（按站点的线程池）和解析（进程池）分成两段同时跑，见 utils.pipeline。
+    解析不再和抓取抢同一个 GIL，页面多时吞吐随核数增长。
+    """
+    from utils.pipeline import run_pipeline
+    by_site: dict[str, list[str]] = {}
+    for site, model in jobs:
+        by_site.setdefault(site, []).append(model)
+    modules = {site: scrapers[site].split(":")[0] for site in by_site}
+    results = {}
+
+    def on_result(job: tuple[str, str], rows: list[PriceObservation] | None):
+        results[job] = None if rows is None else _normalize_rows(*job, rows)
+        emit(job, results[job])
+
+    run_pipeline(by_site, modules, SITE_CONCURRENCY, on_result)
+    return results
+
+
+def _ignore(job, rows):
+    pass
+
+
+def collect_jobs(jobs: list[tuple[str, str]], mode: str = DEFAULT_FETCH_MODE,
+                 on_result=None) -> dict[tuple[str, str], list[PriceObservation] | None]:
+    """
+    抓取指定的 (site, model) 目标：{(site, model): rows | None}，None 表示该目标抓取失败。
+    on_result(job, rows) 在每个目标抓完时立刻回调（调用线程里、按完成先后），
+    用于边抓边处理（见 utils.notify.EarlyAlerter）；返回值仍是全部结果。
+    本轮预算（utils.deadline）用完后没抓到的目标不在结果里，记到摘要的 skipped_deadline。
+    mode: serial（逐个抓取）| concurrent（按站点并行）| pipeline（并行抓取 + 多进程解析）
+    """
+    collect = {"concurrent": _collect_concurrent, "pipeline": _collect_pipeline}.get(mode, _collect_serial)
+    with METRICS.timed("stage_seconds", stage="fetch"):
+        results = collect(jobs, on_result or _ignore)
+    skipped = [job for job in jobs if job not in results]
+    if skipped:
+        for site, model in skipped:
+            METRICS.inc("jobs_skipped_total", site=site, model=model)
+        METRICS.note("skipped_deadline", [f"{site}/{model}" for site, model in skipped])
+        logger.warning("本轮时间预算用完，跳过 %d 个目标。", len(skipped))
+    for (site, model), rows in results.items():
+        if rows is None:
+            METRICS.inc("job_failures_total", site=site, model=model)
+        else:
+            METRICS.inc("rows_total", len(rows), site=site, model=model)
+    return results
+
+
+def flatten_rows(results: dict[tuple[str, str], list[PriceObservation] | None],
+                 jobs: list[tuple[str, str]]) -> list[PriceObservation]:
+    """按 jobs 顺序拼接各目标的行，失败的目标没有行。"""
+    return [r for job in jobs for r in (results.get(job) or [])]
+
+
+def collect_all_rows(mode: str = DEFAULT_FETCH_MODE) -> list[PriceObservation]:
+    """结果按 model × site 的原始顺序拼接，串行/并发输出一致。"""
+    jobs = all_jobs()
+    return flatten_rows(collect_jobs(jobs, mode), jobs)
 
 def in_active_hours(now: datetime, start_hour: int, end_hour: int) -> bool:
     """本地时间的活跃时段，含起止整点。"""
     return start_hour <= now.hour <= end_hour
 
 
-def run_cycle_once() -> None:
-    """跑一轮：抓取 -> 报告 -> 阈值通知"""
-    rows = collect_all_rows()
+def run_cycle_once(fetch_mode: str = DEFAULT_FETCH_MODE) -> None:
+    """跑一轮：抓取（边抓边判定告警）-> 报告 -> 完整的阈值通知"""
+    from utils.notify import EarlyAlerter
+    from utils.session import is_offline
+
+    alerter = EarlyAlerter(dry_run=is_offline())
+    jobs = all_jobs()
+    results = collect_jobs(jobs, fetch_mode, on_result=lambda job, rows: _feed_alerter(alerter, job, rows))
+    process_rows(flatten_rows(results, jobs), early=alerter.fired)
+
+
+def _feed_alerter(alerter, job: tuple[str, str], rows: list[PriceObservation] | None) -> None:
+    if rows and alerter.feed(rows):
+        METRICS.inc("early_alerts_total", site=job[0])
+        logger.info("提前告警：%s（来自 %s）", job[1], job[0])
+
+
+def process_rows(rows: list[PriceObservation], early: dict | None = None) -> None:
+    """
+    抓取之后的部分：快照比对 -> 报告 -> 历史 -> 阈值通知。
+    early：抓取期间已提前发出的告警（EarlyAlerter.fired），轮末判定与它合并记录；
+    去重状态共用，轮末只会对又低了 delta_step 以上的型号再发。
+    离线模式（fixtures/回放）下总是渲染，不写历史和快照，告警只判定不发送。
+    """
+    from utils.report import (render_and_save, snapshot_digests, load_snapshot, save_snapshot,
+                              changed_models, append_heartbeat)
+    from utils.notify import check_and_notify, pending_alerts
+    from utils.history import HISTORY
+    from utils.session import is_offline
+    from utils.observation import dedupe
+
+    offline = is_offline()
+    early = early or {}
+    if early:
+        METRICS.note("early_alerts", sorted(early))
     if not rows:
         logger.info("本轮未抓到数据（all_rows 为空）。")
-    df = render_and_save(rows)                    # 生成 CSV/HTML & 终端表格
-    hits = check_and_notify(df, verbose=False)    # 触发则发邮件
+
+    # 快照与上一轮完全一致：只记心跳，跳过渲染和通知（去重状态不可能变化；
+    # 上一轮有告警没提交成功时不会保存快照，所以这里不会吞掉欠着的告警）
+    digests = snapshot_digests(rows)
+    changed = None if offline else changed_models(digests, load_snapshot())
+    if changed is not None and not changed:
+        append_heartbeat(len(rows))
+        logger.info("快照无变化，跳过报告和通知。")
+        _finish_cycle()
+        return
+
+    with METRICS.timed("stage_seconds", stage="render"):
+        df = render_and_save(rows, changed=changed)   # 生成 CSV/HTML & 终端表格（终端只显示变化的型号）
+    with METRICS.timed("stage_seconds", stage="history"):
+        if not df.empty and not offline:
+            HISTORY.append(dedupe(rows))              # 写入历史库（一次事务），直接写观测，不经 DataFrame
+    with METRICS.timed("stage_seconds", stage="notify"):
+        hits = {**early, **check_and_notify(df, verbose=False, dry_run=offline)}   # 触发则发邮件
+    if not offline:
+        owed = pending_alerts(df)
+        if owed:
+            # 告警没提交成功：不更新快照，下一轮即使价格没变也会重新判定、重发
+            METRICS.note("undelivered", sorted(owed))
+            logger.warning("告警未能提交：%s；保留旧快照，下一轮重试。", ", ".join(sorted(owed)))
+        else:
+            save_snapshot(digests)
+        logger.info("Changed: %s", ", ".join(sorted(changed)))
     logger.info("Triggered: %s", ", ".join(hits.keys()) if hits else "None")
+    METRICS.note("triggered", sorted(hits.keys()))
+    _finish_cycle()
 
 
-def safe_run_once(jitter_range=(DEFAULT_JITTER_SEC_MIN, DEFAULT_JITTER_SEC_MAX)) -> None:
-    """带文件锁 + 抖动的安全执行，避免重叠运行、高并发访问。"""
+def _finish_cycle() -> None:
+    """本轮收尾：写 metrics.prom 和 cycle_summary.jsonl。"""
+    from utils.http_cache import HTTP_CACHE
+    from utils.circuit import BREAKERS, CLOSED
+    METRICS.note("http_cache", HTTP_CACHE.stats())
+    hosts = BREAKERS.snapshot()
+    METRICS.note("hosts", hosts)
+    for host, st in hosts.items():
+        if st["state"] != CLOSED:
+            logger.warning("%s 熔断中（%s，%.0fs 后重试）：%s", host, st["state"], st["retry_in"], st["last_error"])
     try:
-        with FileLock(LOCK_FILE, timeout=1):
-            j = random.randint(*jitter_range)
-            if j:
-                time.sleep(j)
-            run_cycle_once()
+        summary = METRICS.end_cycle()
+        logger.info("本轮耗时 %.1fs；HTTP cache: %s", summary["duration_sec"], summary["http_cache"])
+    except Exception as e:
+        logger.error("写指标失败：%s", e)
+
+
+def _begin_cycle(deadline_sec: float | None, cycle_id: str | None = None) -> None:
+    """一轮开始：metrics 开新一轮；--record 时存档也切到这一轮。"""
+    from utils.session import is_recording
+    METRICS.begin_cycle()
+    METRICS.note("deadline_sec", deadline_sec)
+    if is_recording():
+        from utils.archive import ARCHIVE
+        METRICS.note("archive_cycle", ARCHIVE.begin_cycle(cycle_id))
+
+
+def _jitter(jitter_range, deadline_sec: float | None) -> None:
+    j = random.randint(*jitter_range)
+    if deadline_sec:
+        j = min(j, int(deadline_sec * JITTER_MAX_SHARE))
+    if j:
+        METRICS.observe("stage_seconds", j, stage="jitter")
+        time.sleep(j)
+
+
+def safe_run_once(jitter_range=(DEFAULT_JITTER_SEC_MIN, DEFAULT_JITTER_SEC_MAX),
+                  fetch_mode: str = DEFAULT_FETCH_MODE,
+                  deadline_sec: float | None = DEFAULT_CYCLE_DEADLINE_SEC) -> bool:
+    """
+    带文件锁 + 抖动 + 时间预算的安全执行，避免重叠运行、高并发访问。返回本轮是否真正执行了。
+    预算从拿到锁开始算，抖动也计入；到点后剩下的目标跳过，已抓到的照常出报告、判定告警。
+    """
+    from filelock import FileLock, Timeout
+    try:
+        with FileLock(LOCK_FILE, timeout=1), cycle_deadline(deadline_sec):
+            _begin_cycle(deadline_sec)
+            _jitter(jitter_range, deadline_sec)
+            run_cycle_once(fetch_mode)
     except Timeout:
         logger.info("已有实例在运行，跳过本轮。")
+        return False
+    except Exception as e:
+        logger.error("本轮异常：%s", e)
+        traceback.print_exc()
+    return True
+
+
+def _slot_start(now: float, interval_min: int) -> int:
+    """now 所在时间槽的起点（按 interval_min 对齐的 unix 秒）；分片模式下同一槽的 worker 属于同一轮。"""
+    return int(now // (interval_min * 60)) * interval_min * 60
+
+
+def shard_run_once(jitter_range=(DEFAULT_JITTER_SEC_MIN, DEFAULT_JITTER_SEC_MAX),
+                   fetch_mode: str = DEFAULT_FETCH_MODE,
+                   deadline_sec: float | None = DEFAULT_CYCLE_DEADLINE_SEC,
+                   interval_min: int = DEFAULT_RUN_INTERVAL_MIN) -> bool:
+    """
+    分片模式的一轮，取代全局 .run.lock：同一时间槽（interval_min 对齐）里的所有 worker
+    （同机多进程，或多台机器共用 SHARD_DB）通过 utils.shards 的租约认领互不重叠的 (site, model)，
+    都结束后恰好一个 worker 合并全部结果，出一份报告、做一次告警判定。
+    返回本 worker 是否做了事（抓取或报告）。
+    """
+    from utils.shards import SHARDS, CLAIM_BATCH, POLL_SEC, default_worker_id
+
+    worker = default_worker_id()
+    slot = _slot_start(time.time(), interval_min)
+    cycle_id = datetime.fromtimestamp(slot).strftime("%Y%m%d-%H%M")
+    done = 0
+    try:
+        with cycle_deadline(deadline_sec):
+            _begin_cycle(deadline_sec, cycle_id)    # 各 worker 录下的页面归到同一轮，回放时合在一起
+            _jitter(jitter_range, deadline_sec)
+            SHARDS.open_cycle(cycle_id, all_jobs())
+
+            while True:
+                left = time_left()
+                out_of_time = left is not None and left <= 0
+                claimed = [] if out_of_time else SHARDS.claim(cycle_id, worker, CLAIM_BATCH)
+                if claimed:
+                    results = collect_jobs(claimed, fetch_mode)   # 不提前告警：同一型号可能分在多个 worker 上，由报告者统一判定
+                    done += SHARDS.complete(cycle_id, worker, results)
+                    SHARDS.release(cycle_id, worker, [job for job in claimed if job not in results])
+                    continue
+                # 没活可认领：都结束了就争报告资格；到点了不再等别人的租约
+                if SHARDS.try_report(cycle_id, worker, force=out_of_time):
+                    break
+                if out_of_time or not SHARDS.progress(cycle_id).get("leased"):
+                    # 报告归别的 worker
+                    METRICS.note("shard", {"cycle": cycle_id, "worker": worker, "jobs": done})
+                    logger.info("分片 %s：本 worker 完成 %d 个目标，报告由其他 worker 负责。", cycle_id, done)
+                    _finish_cycle()
+                    return done > 0
+                time.sleep(POLL_SEC if left is None else min(POLL_SEC, max(left, 0.1)))
+
+            rows, missing = SHARDS.merged(cycle_id)
+            METRICS.note("shard", {"cycle": cycle_id, "worker": worker, "jobs": done, "reporter": True,
+                                   "workers": SHARDS.workers(cycle_id)})
+            if missing:
+                METRICS.note("skipped_deadline", [f"{site}/{model}" for site, model in missing])
+            logger.info("分片 %s：合并 %d 行（%d 个目标未完成）。", cycle_id, len(rows), len(missing))
+        process_rows(rows)
+        SHARDS.prune()
     except Exception as e:
         logger.error("本轮异常：%s", e)
         traceback.print_exc()
+    return True
 
 
 def loop(interval_min: int, start_hour: int, end_hour: int,
-         jitter_min: int, jitter_max: int) -> None:
-    """主循环：按间隔在活跃时段运行"""
+         jitter_min: int, jitter_max: int, fetch_mode: str = DEFAULT_FETCH_MODE,
+         deadline_sec: float | None = DEFAULT_CYCLE_DEADLINE_SEC, shard: bool = False) -> None:
+    """
+    主循环：按间隔在活跃时段运行。
+    分片模式下睡到下一个时间槽的起点，而不是固定睡 interval_min：各 worker 每轮耗时不同，
+    固定间隔会让它们漂到不同的槽里（某些槽只有一个 worker，或到了发现已经报告过）。
+    """
     logger.info(
         f"启动循环：每 {interval_min} 分钟；活跃 {start_hour}:00–{end_hour}:59；jitter {jitter_min}-{jitter_max}s"
     )
     while True:
         now = datetime.now()
         if in_active_hours(now, start_hour, end_hour):
-            safe_run_once((jitter_min, jitter_max))
+            if shard:
+                shard_run_once((jitter_min, jitter_max), fetch_mode, deadline_sec, interval_min=interval_min)
+            else:
+                safe_run_once((jitter_min, jitter_max), fetch_mode, deadline_sec)
         else:
             logger.info("非活跃时段，跳过。")
-        time.sleep(interval_min * 60)
+        if shard:
+            now = time.time()
+            time.sleep(_slot_start(now, interval_min) + interval_min * 60 - now)
+        else:
+            time.sleep(interval_min * 60)
+
+
+def _requests_issued() -> int:
+    """本轮实际发出的 HTTP 请求数（含失败和 urllib3 重试），给自适应调度的每小时预算记账。"""
+    return int(sum(METRICS.cycle_count(name)
+                   for name in ("http_requests_total", "http_errors_total", "http_retries_total")))
+
+
+def _adaptive_poll(sched, due: list[tuple[str, str]],
+                   latest: dict[tuple[str, str], list[PriceObservation]], jobs: list[tuple[str, str]],
+                   fetch_mode: str = DEFAULT_FETCH_MODE,
+                   deadline_sec: float | None = DEFAULT_CYCLE_DEADLINE_SEC) -> None:
+    """
+    自适应循环的一次轮询：抓到期目标，结果交回调度器，并入 latest 后走报告/通知。
+    每个到期目标都会重新入队：抓到了 record()，预算用完 defer()，锁被占用 skip()，出异常按失败 record()。
+    """
+    from filelock import FileLock, Timeout
+    from utils.notify import EarlyAlerter
+    from utils.session import is_offline
+
+    left = list(due)                                  # 还没交回调度器的目标
+    try:
+        with FileLock(LOCK_FILE, timeout=1):
+            _begin_cycle(deadline_sec)
+            alerter = EarlyAlerter(dry_run=is_offline())
+            with cycle_deadline(deadline_sec):
+                results = collect_jobs(due, fetch_mode,
+                                       on_result=lambda job, rows: _feed_alerter(alerter, job, rows))
+            now = time.time()
+            sched.charge(_requests_issued(), now)
+            for job in due:
+                left.remove(job)
+                if job not in results:
+                    sched.defer(job, now)             # 因预算用完没抓，下次优先，不算失败
+                    continue
+                sched.record(job, results[job], now)
+                if results[job] is not None:
+                    latest[job] = results[job]
+            logger.info("本次轮询 %d 个目标：%s", len(due), ", ".join(f"{s}/{m}" for s, m in due))
+            process_rows(flatten_rows(latest, jobs), early=alerter.fired)
+    except Timeout:
+        # 锁被占用不是目标的问题：不退避，按原间隔顺延
+        logger.info("已有实例在运行，按原间隔顺延。")
+        now = time.time()
+        for job in left:
+            sched.skip(job, now)
+    except Exception as e:
+        logger.error("本轮异常：%s", e)
+        traceback.print_exc()
+        now = time.time()
+        for job in left:
+            sched.record(job, None, now)
+
+
+def adaptive_loop(start_hour: int, end_hour: int, fetch_mode: str = DEFAULT_FETCH_MODE,
+                  budget_per_hour: int | None = None,
+                  deadline_sec: float | None = DEFAULT_CYCLE_DEADLINE_SEC) -> None:
+    """
+    自适应循环：每个 (site, model) 目标各自决定下次轮询时间（见 utils.scheduler），
+    到期的目标一起抓，结果并入最新快照后走同样的报告/通知流程。
+    """
+    from utils.scheduler import AdaptiveScheduler, REQUEST_BUDGET_PER_HOUR
+    from config import THRESHOLDS
+
+    budget_per_hour = budget_per_hour or REQUEST_BUDGET_PER_HOUR
+    jobs = all_jobs()
+    sched = AdaptiveScheduler(jobs, THRESHOLDS, budget_per_hour=budget_per_hour, now=time.time())
+    latest: dict[tuple[str, str], list[PriceObservation]] = {}
+    logger.info(f"启动自适应循环：{len(jobs)} 个目标；活跃 {start_hour}:00–{end_hour}:59；每小时请求预算 {budget_per_hour}")
+    while True:
+        if not in_active_hours(datetime.now(), start_hour, end_hour):
+            logger.info("非活跃时段，跳过。")
+            time.sleep(600)
+            continue
+
+        due = sched.due(time.time())
+        if due:
+            _adaptive_poll(sched, due, latest, jobs, fetch_mode, deadline_sec)
+
+        time.sleep(min(max(sched.seconds_until_next(time.time()), 1), 600))
+
+
+def _replay_cycle(cycle: str, started: float, fetch_mode: str, deadline_sec: float | None,
+                  backfill: bool) -> None:
+    """回放一轮：解析 -> 报告（按轮次命名，写到 REPLAY_DIR）-> 告警只判定；backfill 时按存档时间写历史。"""
+    from utils.archive import ARCHIVE
+    from utils.report import render_and_save
+    from utils.notify import check_and_notify
+    from utils.history import HISTORY
+    from utils.session import set_offline
+    from utils.observation import dedupe
+
+    set_offline(ARCHIVE.lookup(cycle))
+    METRICS.begin_cycle()
+    METRICS.note("replay_cycle", cycle)
+    jobs = all_jobs()
+    with cycle_deadline(deadline_sec):
+        rows = flatten_rows(collect_jobs(jobs, fetch_mode), jobs)
+    stamp = f"{cycle}_{datetime.fromtimestamp(started):%Y%m%d-%H%M%S}"
+    df = render_and_save(rows, outdir=REPLAY_DIR, stamp=stamp)
+    if backfill and not df.empty:
+        if HISTORY.has_snapshot(started):
+            logger.info("历史库里已有 %s 的观测，不重复写入。", stamp)
+        else:
+            METRICS.note("history_backfilled", HISTORY.append(dedupe(rows), ts=started))
+    hits = check_and_notify(df, verbose=False, dry_run=True)
+    logger.info("Triggered: %s", ", ".join(hits.keys()) if hits else "None")
+    METRICS.note("triggered", sorted(hits.keys()))
+    METRICS.end_cycle(REPLAY_DIR)
+
+
+def replay(which: str, fetch_mode: str = DEFAULT_FETCH_MODE,
+           deadline_sec: float | None = DEFAULT_CYCLE_DEADLINE_SEC, backfill: bool = False) -> None:
+    """
+    用 --record 存下的页面离线重跑抓取之后的流程（解析 -> 报告 -> 告警判定），不联网、不抖动。
+    和线上互不干扰：不拿 .run.lock，报告和指标写到 REPLAY_DIR（文件名带轮次 id 和存档时间），
+    不写快照，告警只判定不发送。backfill=True 时把结果按存档时间写进历史库（已有的那一秒跳过）。
+    which：轮次 id；前缀表示按时间顺序重放其中每一轮；latest 表示最近一轮。
+    """
+    from utils.archive import ARCHIVE
+    from utils.session import set_offline
+
+    cycles = [(c, started) for c, _, started in ARCHIVE.cycles("" if which == "latest" else which)]
+    if which == "latest":
+        cycles = cycles[-1:]
+    if not cycles:
+        logger.error("存档里没有轮次 %s（ARCHIVE_DIR=%s）。", which, ARCHIVE.root)
+        return
+    try:
+        for cycle, started in cycles:
+            logger.info("回放 %s", cycle)
+            try:
+                _replay_cycle(cycle, started, fetch_mode, deadline_sec, backfill)
+            except Exception as e:
+                logger.error("回放 %s 异常：%s", cycle, e)
+                traceback.print_exc()
+    finally:
+        set_offline(None)
+
+
+def _drain_outbox() -> None:
+    """单次模式进程马上退出：把 outbox 里的告警发完再走（发不出去的留到下次）。"""
+    from utils.mailer import MAILER
+    if not MAILER.drain():
+        logger.info("部分告警未能发出，已留在 outbox。")
 
 
 def main():
+    from dotenv import load_dotenv
     load_dotenv()  # 允许用 .env 覆盖配置（比如 SMTP 密钥、间隔等）
 
     parser = argparse.ArgumentParser(description="TV price scraper scheduler")
     parser.add_argument("--once", action="store_true", help="只执行一轮并退出")
     parser.add_argument("--loop", action="store_true", help="循环执行（默认）")
+    parser.add_argument("--fetch-mode", choices=["serial", "concurrent", "pipeline"],
+                        default=os.getenv("FETCH_MODE", DEFAULT_FETCH_MODE),
+                        help="抓取模式：serial 逐个 / concurrent 按站点并行 / pipeline 并行抓取 + 多进程解析"
+                             "（也可用 FETCH_MODE）")
+    parser.add_argument("--adaptive", action="store_true",
+                        default=os.getenv("ADAPTIVE", "0") == "1",
+                        help="循环模式下按目标自适应轮询（也可用 ADAPTIVE=1）")
+    parser.add_argument("--profile", action="store_true",
+                        help="与 --once 一起用：在 cProfile + tracemalloc 下跑一轮，结果写到 reports/profiles/")
+    parser.add_argument("--fixtures", metavar="MANIFEST",
+                        help="离线模式：按 {url: 文件} 清单读页面（如 bench/fixtures/urls.json），不联网、不抖动")
+    parser.add_argument("--shard", action="store_true",
+                        default=os.getenv("SHARD", "0") == "1",
+                        help="分片模式：多个 worker 通过 SHARD_DB 的租约分摊目标，合并出一份报告（也可用 SHARD=1）")
+    parser.add_argument("--record", action="store_true",
+                        default=os.getenv("RECORD", "0") == "1",
+                        help="把抓到的每个页面存进 ARCHIVE_DIR（内容寻址、gzip，跨轮次去重），供 --replay 使用（也可用 RECORD=1）")
+    parser.add_argument("--replay", metavar="CYCLE",
+                        help="离线重放存档里的一轮（轮次 id、前缀如 202610 表示其中每一轮、或 latest）：不联网、不抖动，"
+                             "报告写到 REPLAY_DIR")
+    parser.add_argument("--backfill", action="store_true",
+                        help="与 --replay 一起用：把回放结果按存档时间写进历史库")
     args = parser.parse_args()
+    if args.shard and args.adaptive:
+        parser.error("--shard 暂不支持 --adaptive")
+    if args.replay and (args.fixtures or args.record):
+        parser.error("--replay 不能和 --fixtures / --record 一起用")
+    if args.backfill and not args.replay:
+        parser.error("--backfill 只能和 --replay 一起用")
+
+    if args.fixtures:
+        from utils.session import set_offline, fixture_lookup
+        set_offline(fixture_lookup(args.fixtures))
+    if args.record:
+        from utils.session import set_recorder
+        from utils.archive import ARCHIVE
+        set_recorder(ARCHIVE.record)
 
     # 读取环境变量覆盖
     interval = int(os.getenv("RUN_INTERVAL_MIN", DEFAULT_RUN_INTERVAL_MIN))
@@ -120,18 +641,54 @@ def main():
     end_h    = int(os.getenv("RUN_HOUR_END",     DEFAULT_RUN_HOUR_END))
     jit_min  = int(os.getenv("JITTER_SEC_MIN",   DEFAULT_JITTER_SEC_MIN))
     jit_max  = int(os.getenv("JITTER_SEC_MAX",   DEFAULT_JITTER_SEC_MAX))
+    budget   = int(os.getenv("REQUEST_BUDGET_PER_HOUR", 0)) or None
+    deadline = float(os.getenv("CYCLE_DEADLINE_SEC", DEFAULT_CYCLE_DEADLINE_SEC)) or None
+
+    if args.fixtures:
+        jit_min = jit_max = 0
+
+    if args.replay:
+        replay(args.replay, args.fetch_mode, deadline, backfill=args.backfill)
+        return
+
+    if args.once and args.profile:
+        from utils.profiling import profiled
+        logger.info("单次模式（profile）启动。")
+        with profiled() as paths:
+            ran = safe_run_once((0, 0), args.fetch_mode, deadline)   # 抖动只是 sleep，不计入 profile
+        for kind, path in paths.items():
+            logger.info("profile %s -> %s", kind, path)
+        if ran:
+            _drain_outbox()
+        return
 
     if args.once:
+        # 先做便宜的检查（活跃时段、锁），都通过了才会加载重模块
+        if not args.fixtures and not in_active_hours(datetime.now(), start_h, end_h):
+            logger.info("非活跃时段，跳过。")
+            return
         logger.info("单次模式启动。")
-        safe_run_once((jit_min, jit_max))
+        if args.shard:
+            ran = shard_run_once((jit_min, jit_max), args.fetch_mode, deadline, interval_min=interval)
+        else:
+            ran = safe_run_once((jit_min, jit_max), args.fetch_mode, deadline)
+        if ran:
+            _drain_outbox()
         return
 
     # 默认进入循环
+    from utils.mailer import MAILER
     logger.info("循环模式启动。按 Ctrl+C 退出。")
+    MAILER.start()                                # 顺带投递上次遗留在 outbox 的告警
     try:
-        loop(interval, start_h, end_h, jit_min, jit_max)
+        if args.adaptive:
+            adaptive_loop(start_h, end_h, args.fetch_mode, budget, deadline)
+        else:
+            loop(interval, start_h, end_h, jit_min, jit_max, args.fetch_mode, deadline, args.shard)
     except KeyboardInterrupt:
         logger.info("收到中断，退出。")
+    finally:
+        MAILER.stop()
 
 
 if __name__ == "__main__":
@@ -1,14 +1,94 @@
-import re
+import os
 from urllib.parse import quote
-from bs4 import BeautifulSoup
-from utils.session import build_session, prefetch_homepage, safe_get
-from utils.filters import normalize, looks_like_target
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree, html as lxml_html
+from utils.session import SESSION_POOL, safe_get
+from utils.filters import get_matcher, RRP_PAT
 from utils.price_parser import extract_price_from_node
+from utils.metrics import METRICS
+from utils.catalog import CATALOG
+from utils.observation import PriceObservation
+from utils.deadline import DeadlineExceeded
 
 BASE_URL = "https://www.amazon.co.uk"
 
-def _parse_search_items(html: str, model_query: str):
-    soup = BeautifulSoup(html, "lxml")
+CATALOG_SITE = "Amazon"       # 在 config.PRODUCTS 里的站点名
+
+# 批量搜索：目录里 group 相同的型号合并成一次搜索（例如 "LG OLED C4" 同时覆盖 55/65 寸）
+BATCH_MAX_MODELS = 6          # 单次搜索最多服务的型号数，避免结果页装不下
+
+# 解析模式：xpath（lxml + 预编译 XPath，一次遍历取齐字段）| soup（原 BeautifulSoup 路径）
+PARSER_MODE = os.getenv("AMAZON_PARSER", "xpath")
+
+def _cls(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+X_ITEMS = etree.XPath('//div[@data-component-type="s-search-result"]')
+X_H2 = etree.XPath(f".//a[{_cls('a-link-normal')}]//h2")
+X_H2_LINK = etree.XPath(f"ancestor::a[{_cls('a-link-normal')}][1]")
+X_OFFSCREEN = etree.XPath(f".//span[{_cls('a-price')}]//span[{_cls('a-offscreen')}]")
+X_WHOLE = etree.XPath(f".//span[{_cls('a-price-whole')}]")
+X_FRACTION = etree.XPath(f".//span[{_cls('a-price-fraction')}]")
+X_TEXT = etree.XPath(".//text()")
+
+def _text(el) -> str:
+    # 与 get_text(strip=True) 一致：逐段去空白后直接拼接
+    return "".join(t.strip() for t in X_TEXT(el))
+
+def _first(xp, el):
+    found = xp(el)
+    return found[0] if found else None
+
+def _xpath_price(it):
+    """与 utils.price_parser.extract_price_from_node 同样的取价顺序。"""
+    off = _first(X_OFFSCREEN, it)
+    if off is not None:
+        txt = _text(off)
+        if txt and not RRP_PAT.search(txt):
+            return txt
+    whole = _first(X_WHOLE, it)
+    if whole is not None:
+        w = _text(whole).replace(",", "")
+        frac = _first(X_FRACTION, it)
+        f = _text(frac) if frac is not None else "00"
+        if w.isdigit():
+            return f"£{w}.{f}"
+    return None
+
+def _parse_all_items_xpath(html: str):
+    try:
+        root = lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return []
+    results = []
+    for it in X_ITEMS(root):
+        asin = it.get("data-asin")
+        h2 = _first(X_H2, it)
+        title = _text(h2) if h2 is not None else ""
+        url = None
+        if h2 is not None:
+            a = _first(X_H2_LINK, h2)
+            if a is not None and a.get("href") is not None:
+                url = BASE_URL + a.get("href")
+        if url and "/dp/" not in url:
+            url = None
+        results.append({"asin": asin, "title": title, "url": url, "price": _xpath_price(it)})
+    return results
+
+def _parse_items(html: str):
+    if PARSER_MODE == "xpath":
+        return _parse_all_items_xpath(html)
+    return _parse_all_items_soup(html)
+
+def _parse_all_items(html: str):
+    with METRICS.timed("parse_seconds", site=CATALOG_SITE):
+        return _parse_items(html)
+
+# soup 模式下也只建搜索结果的子树
+RESULT_STRAINER = SoupStrainer("div", attrs={"data-component-type": "s-search-result"})
+
+def _parse_all_items_soup(html: str):
+    soup = BeautifulSoup(html, "lxml", parse_only=RESULT_STRAINER)
     items = soup.select('div[data-component-type="s-search-result"]')
     results = []
 
@@ -26,25 +106,105 @@ def _parse_search_items(html: str, model_query: str):
         price = extract_price_from_node(it)
         results.append({"asin": asin, "title": title, "url": url, "price": price})
 
-    return [r for r in results if looks_like_target(r["title"], model_query)]
+    return results
 
-def scrape(model: str):
-    s = build_session()
-    prefetch_homepage(s, BASE_URL)
-    search_url = f"{BASE_URL}/s?k={quote(model)}"
-    html = safe_get(s, search_url)
-    candidates = _parse_search_items(html, model)
+def _parse_search_items(html: str, model_query: str):
+    items = _parse_all_items(html)
+    mask = get_matcher(model_query).classify([r["title"] for r in items])
+    return [r for r, ok in zip(items, mask) if ok]
+
+def _to_rows(model: str, candidates: list[dict]) -> list[PriceObservation]:
     out = []
     for c in candidates:
         price = c["price"]
         in_stock = bool(price)  # 只要有价格就认为有货，否则无货
 
-        out.append({
-            "site": "Amazon",
-            "model": model,
-            "title": c["title"],
-            "price": price or "N/A",
-            "url": c["url"],
-            "in_stock": in_stock,
-        })
-    return list({r["url"]: r for r in out if r["url"]}.values())
+        out.append(PriceObservation.make(
+            site=CATALOG_SITE,
+            model=model,
+            price=price or "N/A",
+            title=c["title"],
+            url=c["url"],
+            in_stock=in_stock,
+        ))
+    return list({r.url: r for r in out if r.url}.values())
+
+def _search(query: str) -> str:
+    search_url = f"{BASE_URL}/s?k={quote(query)}"
+    with SESSION_POOL.borrow(BASE_URL, prefetch=True) as s:
+        return safe_get(s, search_url)
+
+def _query(model: str) -> str:
+    target = CATALOG.target(CATALOG_SITE, model) or {}
+    return target.get("query") or model
+
+def _batch_queries(models: list[str]) -> list[tuple[str, list[str]]]:
+    """
+    按目录里的 group 分组生成搜索词：[(query, [model, ...]), ...]
+    组里只有一个型号时直接搜型号本身的 query；没有 group 的型号单独搜。
+    """
+    groups: dict[str, list[str]] = {}
+    for m in models:
+        group = (CATALOG.target(CATALOG_SITE, m) or {}).get("group")
+        groups.setdefault(group or f"model:{m}", []).append(m)
+
+    queries = []
+    for key, ms in groups.items():
+        for i in range(0, len(ms), BATCH_MAX_MODELS):
+            chunk = ms[i:i + BATCH_MAX_MODELS]
+            query = _query(chunk[0]) if len(chunk) == 1 else key
+            queries.append((query, chunk))
+    return queries
+
+# ---------------- 流水线阶段（见 utils.pipeline）：plan -> fetch(I/O) -> parse(CPU) -> finish ----------------
+def plan(models: list[str]) -> list[dict]:
+    """每个搜索词一页；不发请求。"""
+    return [{"site": CATALOG_SITE, "models": chunk, "query": query} for query, chunk in _batch_queries(models)]
+
+def fetch(page: dict) -> dict:
+    page["html"] = _search(page["query"])
+    page["parsed"] = None
+    return page
+
+def parse(page: dict) -> list[dict]:
+    """纯 CPU，可在子进程里跑：搜索结果页 -> 全部条目。"""
+    return _parse_items(page["html"])
+
+def finish(page: dict, items: list[dict]) -> dict[str, list[PriceObservation]]:
+    """把条目按 ProductMatcher 分发给这一页服务的型号，同一型号内按 ASIN 去重。"""
+    titles = [r["title"] for r in items]
+    out = {}
+    for m in page["models"]:
+        seen = set()
+        candidates = []
+        for r, ok in zip(items, get_matcher(m).classify(titles)):
+            if not ok or (r["asin"] and r["asin"] in seen):
+                continue
+            seen.add(r["asin"])
+            candidates.append(r)
+        out[m] = _to_rows(m, candidates)
+    return out
+
+def scrape_many(models: list[str]) -> dict[str, list[PriceObservation]]:
+    """
+    批量抓取：每组型号只发一次搜索，把结果按 ProductMatcher 分发给所有匹配的型号，
+    同一型号内按 ASIN 去重。返回 {model: rows}，行格式与 scrape() 相同。
+    某一组搜索失败（超时、验证码、解析出错）只影响这一组的型号（记为 []），其他组照常。
+    本轮预算用完时不再搜剩下的组：已抓到的组照常返回，没搜的型号不在结果里（调用方记为跳过）。
+    """
+    out = {}
+    for page in plan(models):
+        try:
+            page = fetch(page)
+            out.update(finish(page, _parse_all_items(page["html"])))
+        except DeadlineExceeded:
+            break
+        except Exception as e:
+            print(f"[Amazon] search {page['query']!r} ({', '.join(page['models'])}) failed: {e}")
+            out.update({m: [] for m in page["models"]})
+    return out
+
+def scrape(model: str):
+    html = _search(_query(model))
+    candidates = _parse_search_items(html, model)
+    return _to_rows(model, candidates)
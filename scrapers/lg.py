@@ -3,17 +3,13 @@
 import json
 from bs4 import BeautifulSoup
 
-from utils.session import build_session, safe_get
+from utils.fast_extract import find_title, iter_jsonld
+from utils.observation import PriceObservation
+from utils.product_pages import ProductPages
 
-SITE = "LG UK"
-
-# 固定链接列表
-PRODUCT_URLS = {
-    "OLED65C4": "https://www.lg.com/uk/tvs-soundbars/oled-evo/oled65c46la/",
-    "OLED55C4": "https://www.lg.com/uk/tvs-soundbars/oled-evo/oled55c46la/",
-    "OLED65B4": "https://www.lg.com/uk/tvs-soundbars/oled/oled65b4ela/",
-    "OLED55B4": "https://www.lg.com/uk/tvs-soundbars/oled/oled55b4ela/",
-}
+CATALOG_SITE = "LG"           # 在 config.PRODUCTS 里的站点名
+# 解析结果的格式/取值逻辑变了就加一，HTTP 缓存里旧版本的解析结果作废
+PARSER_VERSION = 1
 
 
 def extract_jsonld_price(soup: BeautifulSoup):
@@ -61,31 +57,73 @@ def _extract_price(data: dict):
     return price or None, in_stock
 
 
-def scrape(model: str, verify: bool = True):
+def fast_extract_jsonld_price(html: str):
     """
-    返回 LG UK 固定链接的产品信息（若存在）。
+    不建 DOM，直接从原始 HTML 的 JSON-LD 中提取 (price, in_stock)；找不到返回 None。
     """
-    model_key = model.replace(" ", "").upper()
-    for key, url in PRODUCT_URLS.items():
-        if key in model_key:
-            session = build_session()
-            html = safe_get(session, url)
-            soup = BeautifulSoup(html, "lxml")
-
-            title_el = soup.select_one("title")
-            title = title_el.get_text(strip=True) if title_el else key
-
-            price, in_stock = extract_jsonld_price(soup)
-            return [{
-                "site": SITE,
-                "model": model,
-                "title": title,
-                "price": f"£{price}" if price else "N/A",
-                "in_stock": in_stock,
-                "url": url,
-            }]
-
-    return []
+    for data in iter_jsonld(html):
+        items = data if isinstance(data, list) else [data]
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            result = _extract_price(item)
+            if result:
+                return result
+    return None
+
+
+def _parse_page_fast(html: str):
+    title = find_title(html)
+    result = fast_extract_jsonld_price(html)
+    if not title or not result:
+        return None
+    return (title, *result)
+
+
+def _parse_page_dom(html: str, key: str):
+    soup = BeautifulSoup(html, "lxml")
+
+    title_el = soup.select_one("title")
+    title = title_el.get_text(strip=True) if title_el else key
+
+    price, in_stock = extract_jsonld_price(soup)
+    return title, price, in_stock
+
+
+def _parse_page(html: str, key: str):
+    """返回 (title, price, in_stock)；快速路径失败时才建 DOM。"""
+    return _parse_page_fast(html) or _parse_page_dom(html, key)
+
+
+# ---------------- 流水线阶段（见 utils.pipeline）：plan -> fetch(I/O) -> parse(CPU) -> finish ----------------
+PAGES = ProductPages(CATALOG_SITE, PARSER_VERSION)
+plan = PAGES.plan
+fetch = PAGES.fetch
+
+
+def parse(page: dict) -> list:
+    """纯 CPU，可在子进程里跑。"""
+    return list(_parse_page(page["html"], page["key"]))
+
+
+def finish(page: dict, parsed: list) -> dict[str, list[PriceObservation]]:
+    """回到主进程：记下解析结果（供 304 复用），组装行。"""
+    PAGES.remember(page, parsed)
+    model = page["models"][0]
+    title, price, in_stock = parsed
+    return {model: [PriceObservation.make(
+        site=CATALOG_SITE,
+        model=model,
+        price=f"£{price}" if price else "N/A",
+        title=title,
+        url=page["url"],
+        in_stock=in_stock,
+    )]}
+
+
+def scrape(model: str, verify: bool = True):
+    """返回 LG UK 固定链接的产品信息（目录里没有该型号的链接时返回 []）。"""
+    return PAGES.scrape(model, parse, finish)
 
 
 # 本地调试用
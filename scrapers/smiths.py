@@ -1,71 +1,111 @@
 # scrapers/smiths.py
 
-import re
 import json
 from bs4 import BeautifulSoup
 
-from utils.session import build_session, safe_get
+from utils.fast_extract import SF_LAYER_RE, find_title, iter_sf_layer
+from utils.observation import PriceObservation
+from utils.product_pages import ProductPages
 
-SITE = "Smiths TV"
-
-PRODUCT_URLS = {
-    "OLED65C4": "https://www.smithstv.co.uk/lg-oled65c46la-1000007326.html",
-    "OLED55C4": "https://www.smithstv.co.uk/lg-oled55c46la-1000007338.html",
-}
+CATALOG_SITE = "Smiths"       # 在 config.PRODUCTS 里的站点名
+# 解析结果的格式/取值逻辑变了就加一，HTTP 缓存里旧版本的解析结果作废
+# 2：sfDataLayer 逐个 push 查找（之前只看每段脚本的第一个）
+PARSER_VERSION = 2
 
 
 def extract_sf_layer_price(soup: BeautifulSoup):
     """
     从 <script> 标签中提取 sfDataLayer 结构中的价格。
     """
-    pattern = re.compile(r'sfDataLayer\.push\((\{.*?\})\);', re.DOTALL)
     for script in soup.find_all("script"):
         if not script.string:
             continue
-        match = pattern.search(script.string)
-        if not match:
-            continue
+        # 一段脚本里可能 push 好几次（先 pageview 再 ecommerce），逐个看，与快速路径一致
+        for match in SF_LAYER_RE.finditer(script.string):
+            try:
+                data = json.loads(match.group(1))
+                price = _view_price(data)
+                if price:
+                    return price
+            except Exception:
+                continue
+
+    return None
+
+
+def _view_price(data):
+    ecommerce = data.get("ecommerce", {})
+    view = ecommerce.get("view", {})
+    price = view.get("price")
+    return str(price) if price else None
+
 
+def fast_extract_sf_layer_price(html: str):
+    """
+    不建 DOM，直接在原始 HTML 中找 sfDataLayer.push({...}) 的价格；找不到返回 None。
+    """
+    for data in iter_sf_layer(html):
         try:
-            data = json.loads(match.group(1))
-            ecommerce = data.get("ecommerce", {})
-            view = ecommerce.get("view", {})
-            price = view.get("price")
-            if price:
-                return str(price)
+            price = _view_price(data)
         except Exception:
             continue
-
+        if price:
+            return price
     return None
 
 
+def _parse_page_fast(html: str):
+    title = find_title(html)
+    price = fast_extract_sf_layer_price(html)
+    if not title or not price:
+        return None
+    return title, price
+
+
+def _parse_page_dom(html: str, key: str):
+    soup = BeautifulSoup(html, "lxml")
+
+    title_el = soup.select_one("title")
+    title = title_el.get_text(strip=True) if title_el else key
+
+    price = extract_sf_layer_price(soup)
+    return title, price
+
+
+def _parse_page(html: str, key: str):
+    """返回 (title, price)；快速路径失败时才建 DOM。"""
+    return _parse_page_fast(html) or _parse_page_dom(html, key)
+
+
+# ---------------- 流水线阶段（见 utils.pipeline）：plan -> fetch(I/O) -> parse(CPU) -> finish ----------------
+PAGES = ProductPages(CATALOG_SITE, PARSER_VERSION)
+plan = PAGES.plan
+fetch = PAGES.fetch
+
+
+def parse(page: dict) -> list:
+    """纯 CPU，可在子进程里跑。"""
+    return list(_parse_page(page["html"], page["key"]))
+
+
+def finish(page: dict, parsed: list) -> dict[str, list[PriceObservation]]:
+    """回到主进程：记下解析结果（供 304 复用），组装行。"""
+    PAGES.remember(page, parsed)
+    model = page["models"][0]
+    title, price = parsed
+    return {model: [PriceObservation.make(
+        site=CATALOG_SITE,
+        model=model,
+        price=f"£{price}" if price else None,
+        title=title,
+        url=page["url"],
+        in_stock=price is not None,
+    )]}
+
+
 def scrape(model: str, verify: bool = True):
-    """
-    返回 SmithsTV 页面中指定型号的价格和库存状态。
-    """
-    model_key = model.replace(" ", "").upper()
-    for key, url in PRODUCT_URLS.items():
-        if key in model_key:
-            session = build_session()
-            html = safe_get(session, url)
-            soup = BeautifulSoup(html, "lxml")
-
-            title_el = soup.select_one("title")
-            title = title_el.get_text(strip=True) if title_el else key
-
-            price = extract_sf_layer_price(soup)
-            in_stock = price is not None
-
-            return [{
-                "site": SITE,
-                "model": model,
-                "title": title,
-                "price": f"£{price}" if price else None,
-                "in_stock": in_stock,
-                "url": url,
-            }]
-
-    return []
+    """返回 SmithsTV 页面中指定型号的价格和库存状态（目录里没有该型号的链接时返回 []）。"""
+    return PAGES.scrape(model, parse, finish)
 
 
 # 本地调试
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 仓库根目录没有打包配置，测试直接按源码目录导入 scrapers / utils
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 各个落盘的单例在导入时读路径，先指到临时目录，测试不碰工作区里的真实状态
+_TMP = Path(tempfile.mkdtemp(prefix="tvprice-tests-"))
+for var, name in [
+    ("ALERT_STATE_DB", "alert_state.sqlite3"),
+    ("ALERT_OUTBOX", "outbox"),
+    ("HISTORY_DB", "history.sqlite3"),
+    ("METRICS_DIR", "metrics"),
+    ("HTTP_CACHE_DIR", "http_cache"),
+    ("SHARD_DB", "shards.sqlite3"),
+    ("ARCHIVE_DIR", "archive"),
+]:
+    os.environ.setdefault(var, str(_TMP / name))
@@ -0,0 +1,55 @@
+"""scrape_many：一组搜索失败只影响这一组的型号；本轮预算用完时已抓到的组照常返回。"""
+from pathlib import Path
+
+import pytest
+
+import main
+from scrapers import amazon
+from utils.deadline import DeadlineExceeded
+
+C4_PAGE = (Path(__file__).parent.parent / "bench" / "fixtures" / "amazon_search_oled_c4.html").read_text(encoding="utf-8")
+MODELS = ["OLED55C4", "OLED65C4", "OLED55B4", "OLED65B4"]
+
+
+def test_failed_group_does_not_drop_other_groups(monkeypatch):
+    searched = []
+
+    def fake_search(query):
+        searched.append(query)
+        if query == "LG OLED B4":
+            raise TimeoutError("read timed out")
+        return C4_PAGE
+
+    monkeypatch.setattr(amazon, "_search", fake_search)
+    out = amazon.scrape_many(MODELS)
+
+    assert sorted(searched) == ["LG OLED B4", "LG OLED C4"]
+    assert out["OLED55B4"] == [] and out["OLED65B4"] == []
+    assert out["OLED55C4"] and out["OLED65C4"]
+    assert all(r.model == "OLED65C4" for r in out["OLED65C4"])
+
+
+def _deadline_on_b4(monkeypatch):
+    def fake_search(query):
+        if query == "LG OLED B4":
+            raise DeadlineExceeded("cycle deadline passed")
+        return C4_PAGE
+    monkeypatch.setattr(amazon, "_search", fake_search)
+
+
+def test_deadline_keeps_groups_already_fetched(monkeypatch):
+    _deadline_on_b4(monkeypatch)
+    out = amazon.scrape_many(MODELS)
+    assert sorted(out) == ["OLED55C4", "OLED65C4"]    # 没搜到的组不在结果里，不是 []
+    assert out["OLED55C4"] and out["OLED65C4"]
+
+
+@pytest.mark.parametrize("mode", ["serial", "concurrent"])
+def test_collect_jobs_reports_partial_batch_and_skips_the_rest(monkeypatch, mode):
+    _deadline_on_b4(monkeypatch)
+    emitted = []
+    jobs = [("Amazon", m) for m in MODELS]
+    out = main.collect_jobs(jobs, mode, on_result=lambda job, rows: emitted.append(job))
+    assert sorted(out) == [("Amazon", "OLED55C4"), ("Amazon", "OLED65C4")]
+    assert all(out.values())
+    assert sorted(emitted) == sorted(out)
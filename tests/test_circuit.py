@@ -0,0 +1,141 @@
+"""按 host 的熔断器：closed -> open -> half_open 的转换、单一探测者、release()。"""
+import threading
+
+import pytest
+
+from utils import circuit
+from utils.circuit import CircuitBreakers, CircuitOpen, CLOSED, OPEN, HALF_OPEN, parse_retry_after
+
+HOST = "www.lg.com"
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(circuit.time, "monotonic", c)
+    return c
+
+
+@pytest.fixture
+def breakers(clock):
+    return CircuitBreakers(threshold=3, window=300, cooldown=60, max_cooldown=240)
+
+
+def _state(b):
+    return b.snapshot()[HOST]["state"]
+
+
+def _in_thread(fn):
+    """在另一个线程里调用 fn，返回它抛出的异常（没有则 None）。"""
+    out = []
+
+    def run():
+        try:
+            fn()
+        except Exception as e:
+            out.append(e)
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+    return out[0] if out else None
+
+
+def test_opens_after_threshold_failures_in_window(breakers, clock):
+    breakers.failure(HOST, "HTTP 503")
+    breakers.failure(HOST, "HTTP 503")
+    breakers.before(HOST)                             # 2 次还不够
+    assert _state(breakers) == CLOSED
+    breakers.failure(HOST, "HTTP 503")
+    assert _state(breakers) == OPEN
+    with pytest.raises(CircuitOpen) as e:
+        breakers.before(HOST)
+    assert e.value.retry_in == pytest.approx(60)
+
+
+def test_failures_outside_window_do_not_count(breakers, clock):
+    breakers.failure(HOST, "timeout")
+    breakers.failure(HOST, "timeout")
+    clock.t += 301
+    breakers.failure(HOST, "timeout")
+    assert _state(breakers) == CLOSED
+
+
+def test_success_resets_failure_count(breakers):
+    breakers.failure(HOST, "timeout")
+    breakers.failure(HOST, "timeout")
+    breakers.success(HOST)
+    breakers.failure(HOST, "timeout")
+    assert _state(breakers) == CLOSED
+
+
+def test_half_open_after_cooldown_with_single_probe_owner(breakers, clock):
+    for _ in range(3):
+        breakers.failure(HOST, "HTTP 500")
+    clock.t += 59
+    with pytest.raises(CircuitOpen):
+        breakers.before(HOST)
+    clock.t += 1
+    breakers.before(HOST)                             # 本线程成为探测者
+    assert _state(breakers) == HALF_OPEN
+    breakers.before(HOST)                             # 同一线程重复调用不占第二个名额
+    assert isinstance(_in_thread(lambda: breakers.before(HOST)), CircuitOpen)
+
+    breakers.success(HOST)
+    assert _state(breakers) == CLOSED
+    assert _in_thread(lambda: breakers.before(HOST)) is None
+
+
+def test_failed_probe_reopens_with_doubled_cooldown(breakers, clock):
+    for _ in range(3):
+        breakers.failure(HOST, "HTTP 500")
+    clock.t += 60
+    breakers.before(HOST)
+    breakers.failure(HOST, "HTTP 500")
+    assert _state(breakers) == OPEN
+    assert breakers.snapshot()[HOST]["retry_in"] == pytest.approx(120)
+    for _ in range(3):                                # 再失败也不超过 max_cooldown
+        clock.t += 1000
+        breakers.before(HOST)
+        breakers.failure(HOST, "HTTP 500")
+    assert breakers.snapshot()[HOST]["retry_in"] == pytest.approx(240)
+
+
+def test_release_frees_the_probe_slot(breakers, clock):
+    for _ in range(3):
+        breakers.failure(HOST, "HTTP 500")
+    clock.t += 60
+    breakers.before(HOST)
+    assert isinstance(_in_thread(lambda: breakers.before(HOST)), CircuitOpen)
+    breakers.release(HOST)                            # 请求被截止时间截断，没结果
+    assert _state(breakers) == HALF_OPEN
+    assert _in_thread(lambda: breakers.before(HOST)) is None   # 别的线程可以接着探测
+
+
+def test_release_by_non_owner_is_a_no_op(breakers, clock):
+    for _ in range(3):
+        breakers.failure(HOST, "HTTP 500")
+    clock.t += 60
+    breakers.before(HOST)
+    _in_thread(lambda: breakers.release(HOST))
+    assert isinstance(_in_thread(lambda: breakers.before(HOST)), CircuitOpen)
+
+
+def test_retry_after_opens_immediately(breakers, clock):
+    breakers.failure(HOST, "HTTP 429", retry_after=90)
+    assert _state(breakers) == OPEN
+    assert breakers.snapshot()[HOST]["retry_in"] == pytest.approx(90)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412400) == pytest.approx(80)
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,40 @@
+"""快速路径（正则）和 BeautifulSoup 路径对同一页面必须给出相同结果。"""
+from pathlib import Path
+
+import pytest
+
+from scrapers import lg, smiths
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _html(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("name", ["lg_in_stock.html", "lg_out_of_stock.html"])
+def test_lg_fast_matches_dom(name):
+    html = _html(name)
+    fast = lg._parse_page_fast(html)
+    assert fast is not None
+    assert fast == lg._parse_page_dom(html, "KEY")
+
+
+def test_lg_values():
+    assert lg._parse_page_fast(_html("lg_in_stock.html")) == (
+        "LG OLED65C4 OLED65C46LA 2024 OLED evo 4K Smart TV & Dolby Atmos | LG UK", "1,799.98", True)
+    assert lg._parse_page_fast(_html("lg_out_of_stock.html"))[1:] == ("999.99", False)
+
+
+def test_smiths_fast_matches_dom():
+    html = _html("smiths_product.html")
+    fast = smiths._parse_page_fast(html)
+    assert fast == ('LG OLED65C46LA 65" C4 OLED evo TV | Smiths TV', "1749.0")
+    assert fast == smiths._parse_page_dom(html, "KEY")
+
+
+def test_fast_path_gives_up_without_structured_data():
+    html = "<html><head><title>Product</title></head><body>£1,299</body></html>"
+    assert lg._parse_page_fast(html) is None
+    assert smiths._parse_page_fast(html) is None
+    assert lg._parse_page(html, "KEY") == lg._parse_page_dom(html, "KEY") == ("Product", None, False)
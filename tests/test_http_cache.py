@@ -0,0 +1,25 @@
+"""HTTP 缓存：解析结果按解析器版本作废；304 不给 TTL 续期。"""
+import time
+
+from utils.http_cache import HttpCache
+
+URL = "https://www.smithstv.co.uk/lg-oled65c46la-1000007326.html"
+
+
+def test_parsed_result_from_another_parser_version_is_ignored(tmp_path):
+    cache = HttpCache(tmp_path)
+    cache.store(URL, "<html></html>", etag='"v1"', last_modified=None)
+    cache.save_parsed(URL, ["LG OLED65C4", "1299.00"], version=1)
+    assert cache.parsed(URL, 1) == ["LG OLED65C4", "1299.00"]
+    assert cache.parsed(URL, 2) is None               # 解析器修过了：重新解析
+
+
+def test_revalidation_does_not_extend_ttl(tmp_path):
+    cache = HttpCache(tmp_path, ttl=0.2)
+    cache.store(URL, "<html></html>", etag='"v1"', last_modified=None)
+    time.sleep(0.12)
+    meta = cache.lookup(URL)
+    cache.revalidated(URL, meta)                      # 304
+    assert cache.stats()["hits"] == 1
+    time.sleep(0.12)
+    assert cache.lookup(URL) is None                  # 按最初下载时间过期，下次完整下载
@@ -0,0 +1,97 @@
+"""后台投递线程、失败退避和 drain()，用替身 smtplib.SMTP 代替真实服务器。"""
+import time
+
+import pytest
+
+from utils import mailer as mailer_mod
+from utils.mailer import Mailer, RETRY_BASE_SEC
+
+
+class FakeSMTP:
+    """记录发出的邮件；refuse > 0 时接下来这么多次连接直接失败。"""
+    sent: list = []
+    refuse = 0
+
+    def __init__(self, host, port, timeout=None):
+        if FakeSMTP.refuse:
+            FakeSMTP.refuse -= 1
+            raise ConnectionRefusedError("connection refused")
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return 250, b"OK"
+
+    def send_message(self, msg):
+        FakeSMTP.sent.append(msg["Subject"])
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    FakeSMTP.sent, FakeSMTP.refuse = [], 0
+    monkeypatch.setattr(mailer_mod.smtplib, "SMTP", FakeSMTP)
+    return FakeSMTP
+
+
+@pytest.fixture
+def make_mailer(tmp_path):
+    made = []
+
+    def make(**kw):
+        m = Mailer(outbox=tmp_path / "outbox", user=None, starttls=False, **kw)
+        made.append(m)
+        return m
+    yield make
+    for m in made:
+        m.stop()
+
+
+def _wait_until(cond, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return cond()
+
+
+def test_background_thread_delivers_queued_message(smtp, make_mailer):
+    m = make_mailer()
+    m.enqueue("Deals: OLED65C4 £1199 @ LG", "<p>x</p>")
+    assert _wait_until(lambda: smtp.sent)
+    assert smtp.sent == ["Deals: OLED65C4 £1199 @ LG"]
+    assert _wait_until(lambda: not m.pending())
+
+
+def test_failed_send_backs_off_and_drain_flushes(smtp, make_mailer):
+    m = make_mailer()
+    smtp.refuse = 2                       # 第一次连接和重连都失败
+    m.enqueue("Deals: OLED55C4 £899 @ Amazon", "<p>x</p>")
+    assert _wait_until(lambda: m.pending() and m.pending()[0][1]["attempts"] == 1)
+
+    (_, msg), = m.pending()
+    assert "refused" in msg["last_error"]
+    assert msg["next_try"] >= msg["created"] + RETRY_BASE_SEC - 1
+    assert smtp.sent == []
+
+    assert m.drain(timeout=5) is True     # 忽略退避时间，立即重发
+    assert smtp.sent == ["Deals: OLED55C4 £899 @ Amazon"]
+    assert m.pending() == []
+
+
+def test_drain_sends_digest_inside_window(smtp, make_mailer):
+    m = make_mailer(digest_window=3600)   # 窗口没到，后台线程不会发
+    m.enqueue("Deals: OLED55C4 £899 @ Amazon", "<p>a</p>")
+    m.enqueue("Deals: OLED65B4 £799 @ LG", "<p>b</p>")
+    time.sleep(0.1)
+    assert smtp.sent == [] and len(m.pending()) == 2
+
+    assert m.drain(timeout=5) is True
+    assert smtp.sent == ["Deals digest (2): OLED55C4 £899 @ Amazon | OLED65B4 £799 @ LG"]
@@ -0,0 +1,99 @@
+"""两段流水线的收尾：主线程提前退出不卡死、解析交不出去不漏名额、坏掉的进程池会重建。"""
+import sys
+import threading
+import time
+
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import pipeline
+
+# 本文件自己就是流水线的站点模块：plan/fetch/parse/finish
+SITE = "Fake"
+MODULES = {SITE: __name__}
+PARSED: list[dict] | None = None          # 非 None 时 fetch 直接带上解析结果（相当于 304），不进进程池
+
+
+def plan(models):
+    return [{"site": SITE, "models": [m]} for m in models]
+
+
+def fetch(page):
+    page["html"] = f"<p>{page['models'][0]}</p>"
+    page["parsed"] = PARSED
+    return page
+
+
+def parse(page):
+    return [{"title": page["html"]}]
+
+
+def finish(page, items):
+    return {page["models"][0]: items}
+
+
+@pytest.fixture(autouse=True)
+def small_queue(monkeypatch):
+    monkeypatch.setattr(pipeline, "QUEUE_SIZE", 1)
+    monkeypatch.setattr(pipeline, "PARSE_WORKERS", 1)
+
+
+def _run_with_timeout(fn, timeout=10):
+    out = {}
+
+    def run():
+        try:
+            out["value"] = fn()
+        except Exception as e:
+            out["error"] = e
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), "run_pipeline hung"
+    return out
+
+
+def test_early_exit_does_not_deadlock_on_full_queue(monkeypatch):
+    monkeypatch.setattr(sys.modules[__name__], "PARSED", [])
+
+    def boom(job, rows):
+        raise RuntimeError("on_result failed")
+
+    models = [f"M{i}" for i in range(8)]
+    t0 = time.monotonic()
+    out = _run_with_timeout(lambda: pipeline.run_pipeline({SITE: models}, MODULES, {SITE: 4}, on_result=boom))
+    assert isinstance(out.get("error"), RuntimeError)
+    assert time.monotonic() - t0 < 5
+
+
+class RejectingPool:
+    def submit(self, *a, **kw):
+        raise RuntimeError("cannot submit")
+
+
+def test_failed_submit_releases_in_flight_slot(monkeypatch):
+    monkeypatch.setattr(pipeline, "parse_pool", lambda: RejectingPool())
+    models = ["A", "B", "C"]
+    out = _run_with_timeout(lambda: pipeline.run_pipeline({SITE: models}, MODULES, {SITE: 1}))
+    assert out["value"] == {(SITE, m): None for m in models}
+
+
+class BrokenPool:
+    def __init__(self):
+        self.shut = False
+
+    def submit(self, *a, **kw):
+        raise BrokenProcessPool("a child process terminated abruptly")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut = True
+
+
+def test_broken_pool_is_rebuilt(monkeypatch):
+    broken = BrokenPool()
+    monkeypatch.setattr(pipeline, "_POOL", broken)
+    out = _run_with_timeout(lambda: pipeline.run_pipeline({SITE: ["A", "B"]}, MODULES, {SITE: 1}), timeout=60)
+    assert broken.shut
+    assert pipeline._POOL is not broken
+    assert out["value"] == {(SITE, "A"): [{"title": "<p>A</p>"}], (SITE, "B"): [{"title": "<p>B</p>"}]}
+    pipeline._POOL.shutdown(wait=True)
@@ -0,0 +1,42 @@
+"""轮末处理：告警没提交成功时不能保存快照，否则下一轮“无变化”会把告警吞掉。"""
+import pytest
+
+import main
+from utils import notify
+from utils.alert_state import AlertStateStore
+from utils.observation import PriceObservation
+
+
+def _rows(price: str):
+    return [PriceObservation.make("LG", "OLED65C4", price, "LG OLED65C4", "https://lg.example/65c4", True)]
+
+
+@pytest.fixture
+def sync_mail(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)                       # reports/ 写到临时目录
+    monkeypatch.setattr(notify, "ALERT_ASYNC", False)
+    monkeypatch.setattr(notify, "ALERT_STATE", AlertStateStore(tmp_path / "alert_state.sqlite3", legacy_json=None))
+    sent = []
+    monkeypatch.setattr(notify, "_send_email", lambda subject, html: sent.append(subject))
+    return sent
+
+
+def test_failed_delivery_keeps_snapshot_so_next_cycle_retries(sync_mail, tmp_path, monkeypatch):
+    def smtp_down(subject, html):
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(notify, "_send_email", smtp_down)
+    main.process_rows(_rows("£1,199.00"))
+    assert not (tmp_path / "reports" / ".snapshot.json").exists()
+    assert notify.ALERT_STATE.get("OLED65C4") == {}
+
+    monkeypatch.setattr(notify, "_send_email", lambda subject, html: sync_mail.append(subject))
+    main.process_rows(_rows("£1,199.00"))             # 价格没变，但上一轮欠着告警
+    assert sync_mail == ["Deals: OLED65C4 £1199 @ LG"]
+    assert (tmp_path / "reports" / ".snapshot.json").exists()
+
+
+def test_unchanged_snapshot_skips_after_successful_delivery(sync_mail):
+    main.process_rows(_rows("£1,199.00"))
+    main.process_rows(_rows("£1,199.00"))
+    assert sync_mail == ["Deals: OLED65C4 £1199 @ LG"]
@@ -0,0 +1,59 @@
+"""--replay：每一轮一份按轮次命名的报告，写到 REPLAY_DIR；不拿运行锁、不碰线上指标；可按存档时间补历史。"""
+import json
+from pathlib import Path
+
+import pytest
+from filelock import FileLock
+
+import main
+from utils import archive, history, notify, session
+from utils.archive import ResponseArchive
+from utils.history import PriceHistory
+
+FIXTURES = Path(__file__).parent.parent / "bench" / "fixtures"
+CYCLES = ["20261015-090000", "20261015-092000", "20261015-094000"]
+
+
+@pytest.fixture
+def archived(tmp_path, monkeypatch):
+    """三轮存档，页面相同、在同一秒内录下（文件名按当前时间时会互相覆盖）。"""
+    store = ResponseArchive(tmp_path / "archive")
+    mapping = json.loads((FIXTURES / "urls.json").read_text(encoding="utf-8"))
+    for cycle in CYCLES:
+        store.begin_cycle(cycle)
+        for url, name in mapping.items():
+            store.record(url, (FIXTURES / name).read_text(encoding="utf-8"))
+    monkeypatch.setattr(archive, "ARCHIVE", store)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "LOCK_FILE", str(tmp_path / ".run.lock"))
+    monkeypatch.setattr(main, "REPLAY_DIR", str(tmp_path / "replay"))
+    monkeypatch.setattr(history, "HISTORY", PriceHistory(tmp_path / "history.sqlite3"))
+    monkeypatch.setattr(notify, "_send_email", lambda *a: pytest.fail("replay must not send mail"))
+    monkeypatch.setattr(notify.MAILER, "enqueue", lambda *a: pytest.fail("replay must not send mail"))
+    monkeypatch.setattr(main.traceback, "print_exc", lambda: pytest.fail("replay raised"))
+    yield store
+    store.close()
+    history.HISTORY.close()
+
+
+def test_each_cycle_gets_its_own_report_outside_live_reports(archived, tmp_path):
+    with FileLock(main.LOCK_FILE):                    # 线上循环正占着锁，回放照常进行
+        main.replay("202610")
+    out = tmp_path / "replay"
+    assert sorted(p.name.split("_")[2] for p in out.glob("tv_prices_*.csv")) == CYCLES
+    assert len(list(out.glob("tv_prices_*.html"))) == 3
+    assert len((out / "cycle_summary.jsonl").read_text(encoding="utf-8").splitlines()) == 3
+    assert not (tmp_path / "reports").exists()        # 线上报告、快照、指标都没碰
+    assert not session.is_offline()
+
+
+def test_backfill_writes_history_at_archived_time_once(archived):
+    started = {c: ts for c, _, ts in archived.cycles()}
+    main.replay("latest", backfill=True)
+    main.replay("latest", backfill=True)              # 同一轮再回放不重复写
+    db = history.HISTORY._db()
+    stamps = [r[0] for r in db.execute("SELECT DISTINCT ts FROM observations")]
+    assert stamps == [int(started[CYCLES[-1]])]
+    n = db.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+    main.replay(CYCLES[0])                            # 不加 backfill 不写历史
+    assert db.execute("SELECT COUNT(*) FROM observations").fetchone()[0] == n > 0
@@ -0,0 +1,128 @@
+"""AdaptiveScheduler：堆的出队顺序、间隔的退避/收紧、按实际请求数记账的每小时预算。"""
+import time
+
+import pytest
+from filelock import FileLock
+
+import main
+from utils.observation import PriceObservation
+from utils.scheduler import AdaptiveScheduler, BACKOFF, BASE_INTERVAL_SEC, MIN_INTERVAL_SEC, MAX_INTERVAL_SEC
+
+A = ("LG", "OLED65C4")
+B = ("Amazon", "OLED65C4")
+C = ("Smiths", "OLED65C4")
+THRESHOLDS = {"OLED65C4": 1000}
+
+
+def _rows(price: str | None, in_stock: bool = True, url: str = "https://lg.example/65c4"):
+    return [PriceObservation.make("LG", "OLED65C4", price, "t", url, in_stock)]
+
+
+def _sched(targets=(A,), budget=1000, now=0.0):
+    return AdaptiveScheduler(list(targets), THRESHOLDS, budget_per_hour=budget, now=now)
+
+
+def test_due_pops_in_time_order_then_insertion_order():
+    s = _sched([A, B, C])
+    assert s.due(0) == [A, B, C]                      # 同时到期：按入队先后
+    s.record(A, _rows("£1,500"), now=0)               # 远离阈值：20 分钟 × 1.5
+    s.record(B, None, now=0)                          # 失败：同样 × 1.5，但晚入队
+    s.record(C, _rows("£1,050"), now=0)               # 接近阈值：减半
+    assert s.due(BASE_INTERVAL_SEC / 2 - 1) == []
+    assert s.due(BASE_INTERVAL_SEC / 2) == [C]
+    assert s.due(BASE_INTERVAL_SEC * BACKOFF) == [A, B]
+
+
+@pytest.mark.parametrize("first, second, expected", [
+    (_rows("£1,500"), _rows("£1,500"), BASE_INTERVAL_SEC * BACKOFF ** 2),       # 没变化、离阈值远
+    (_rows(None, in_stock=False), _rows(None, in_stock=False), BASE_INTERVAL_SEC * BACKOFF ** 4),  # 没货：退避更快
+    (_rows("£1,500"), _rows("£1,450"), MIN_INTERVAL_SEC),                       # 价格变了
+    (_rows("£1,050"), _rows("£1,050"), BASE_INTERVAL_SEC / 4),                  # 接近阈值（+10% 内）
+    (_rows("£900"), _rows("£900"), MIN_INTERVAL_SEC),                           # 已低于阈值：减半到下限为止
+])
+def test_interval_math(first, second, expected):
+    s = _sched()
+    s.due(0)
+    s.record(A, first, now=0)
+    s.due(1e9)
+    assert s.record(A, second, now=1e9) == pytest.approx(expected)
+
+
+def test_failures_back_off_up_to_max():
+    s = _sched()
+    intervals = []
+    for _ in range(20):
+        s.due(1e12)
+        intervals.append(s.record(A, None, now=0))
+    assert intervals[0] == pytest.approx(BASE_INTERVAL_SEC * BACKOFF)
+    assert intervals[1] == pytest.approx(BASE_INTERVAL_SEC * BACKOFF ** 2)
+    assert intervals[-1] == MAX_INTERVAL_SEC
+
+
+def test_budget_counts_requests_actually_issued():
+    s = _sched([A, B, C], budget=3)
+    assert s.due(0) == [A, B, C]                      # 预算按“至少一个请求”放行
+    s.charge(5, now=0)                                # 实际发了 5 个（首页 + 重试）
+    for t in (A, B, C):
+        s.defer(t, now=0)
+    assert s.due(10) == []                            # 超支：一小时内不再放行
+    assert s.seconds_until_next(10) == pytest.approx(3600 - 10)
+    assert s.due(3600) == [A, B, C]                   # 滑动窗口过去后恢复
+
+
+def test_batched_targets_cost_one_request():
+    s = _sched([A, B, C], budget=2)
+    assert s.due(0) == [A, B]
+    s.charge(1, now=0)                                # 两个目标一次批量搜索
+    s.defer(A, 0)
+    s.defer(B, 0)
+    assert s.due(0) == [C]
+
+
+def test_skip_keeps_interval_and_defer_requeues_now():
+    s = _sched([A, B])
+    s.due(0)
+    s.skip(A, now=100)
+    s.defer(B, now=100)
+    assert s.due(100) == [B]
+    assert s.due(100 + BASE_INTERVAL_SEC) == [A]
+    assert s.record(A, _rows("£1,500"), now=0) == pytest.approx(BASE_INTERVAL_SEC * BACKOFF)
+
+
+def test_adaptive_poll_skips_without_backoff_when_lock_is_held(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "LOCK_FILE", str(tmp_path / ".run.lock"))
+    monkeypatch.setattr(main, "collect_jobs", lambda *a, **k: pytest.fail("must not fetch without the lock"))
+    s = _sched([A])
+    due = s.due(0)
+    with FileLock(main.LOCK_FILE):
+        main._adaptive_poll(s, due, {}, [A])
+    assert s.seconds_until_next(time.time()) == pytest.approx(BASE_INTERVAL_SEC, abs=5)   # 按原间隔顺延
+    assert s.record(A, _rows("£1,500"), now=0) == pytest.approx(BASE_INTERVAL_SEC * BACKOFF)   # 间隔没被退避
+
+
+def test_offline_adaptive_poll_sends_no_mail(tmp_path, monkeypatch):
+    from utils import notify, session
+    from utils.alert_state import AlertStateStore
+
+    monkeypatch.chdir(tmp_path)                       # reports/ 写到临时目录
+    monkeypatch.setattr(main, "LOCK_FILE", str(tmp_path / ".run.lock"))
+    monkeypatch.setattr(session, "_OFFLINE", lambda url: None)
+    monkeypatch.setattr(notify, "ALERT_STATE", AlertStateStore(tmp_path / "alert_state.sqlite3", legacy_json=None))
+    sent = []
+    monkeypatch.setattr(notify, "_send_email", lambda subject, html: sent.append(subject))
+    monkeypatch.setattr(notify.MAILER, "enqueue", lambda subject, html: sent.append(subject))
+
+    cheap = _rows("£999.00")                          # 低于 OLED65C4 的阈值
+
+    def collect(jobs, mode, on_result=None):
+        on_result(A, cheap)                           # 边抓边判定的提前告警也要走 dry_run
+        return {A: cheap}
+
+    monkeypatch.setattr(main, "collect_jobs", collect)
+    monkeypatch.setattr(main.traceback, "print_exc", lambda: pytest.fail("offline poll raised"))
+    s = _sched([A])
+    latest = {}
+    main._adaptive_poll(s, s.due(0), latest, [A], deadline_sec=None)
+    assert latest == {A: cheap}
+    assert sent == []
+    assert notify.ALERT_STATE.get("OLED65C4") == {}
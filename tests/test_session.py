@@ -0,0 +1,114 @@
+"""
+safe_get / cached_get 占了 half_open 探测名额却没发出请求时，名额要交还；
+可能带 Retry-After 的响应不在 urllib3 里重试，直接交给熔断器。
+"""
+import http.server
+import threading
+import time
+
+import pytest
+import requests
+
+from utils import session
+from utils.circuit import CircuitBreakers, HALF_OPEN, OPEN
+from utils.deadline import DeadlineExceeded, cycle_deadline
+from utils.http_cache import HttpCache
+
+HOST = "www.lg.com"
+URL = f"https://{HOST}/uk/tvs/oled55c46la"
+
+
+class NoNetwork:
+    def get(self, url, **kw):
+        raise AssertionError(f"unexpected request to {url}")
+
+
+@pytest.fixture
+def breakers(monkeypatch):
+    b = CircuitBreakers(threshold=1, cooldown=0.01)
+    monkeypatch.setattr(session, "BREAKERS", b)
+    b.failure(HOST, "HTTP 503")
+    time.sleep(0.02)                                  # 冷却结束，下一个请求就是探测
+    return b
+
+
+@pytest.fixture
+def slow_jitter(monkeypatch):
+    """抖动睡过本轮截止时间。"""
+    monkeypatch.setattr(session, "jitter_sleep", lambda *a: time.sleep(0.1))
+
+
+def _probe_from_other_thread(b):
+    out = []
+    t = threading.Thread(target=lambda: out.append(b.before(HOST)))
+    t.start()
+    t.join()
+    return bool(out)
+
+
+def test_safe_get_releases_probe_when_deadline_passes_during_jitter(breakers, slow_jitter):
+    with cycle_deadline(0.05), pytest.raises(DeadlineExceeded):
+        session.safe_get(NoNetwork(), URL)
+    assert breakers.snapshot()[HOST]["state"] == HALF_OPEN
+    assert _probe_from_other_thread(breakers)         # 名额已交还，别的线程能来探测
+
+
+def test_cached_get_releases_probe_when_deadline_passes_during_jitter(breakers, slow_jitter, tmp_path):
+    with cycle_deadline(0.05), pytest.raises(DeadlineExceeded):
+        session.cached_get(NoNetwork(), URL, HttpCache(tmp_path))
+    assert _probe_from_other_thread(breakers)
+
+
+def test_expired_deadline_does_not_claim_probe(breakers):
+    with cycle_deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            session.safe_get(NoNetwork(), URL)
+    assert _probe_from_other_thread(breakers)
+
+
+class _Status(http.server.BaseHTTPRequestHandler):
+    status, headers_out, hits = 503, {}, 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        self.send_response(self.status)
+        for k, v in self.headers_out.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *a):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    handler = type("Handler", (_Status,), {"hits": 0, "headers_out": {}})
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(session, "BREAKERS", CircuitBreakers())
+    monkeypatch.setattr(session, "jitter_sleep", lambda *a: None)
+    yield handler, f"http://127.0.0.1:{srv.server_address[1]}/p"
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retry_after_statuses_go_straight_to_the_breaker(server, status):
+    handler, url = server
+    handler.status, handler.headers_out = status, {"Retry-After": "120"}
+    with pytest.raises(requests.HTTPError):
+        session.safe_get(session.build_session(), url)
+    assert handler.hits == 1                          # urllib3 不再无视 Retry-After 立刻重试
+    st = session.BREAKERS.snapshot()[session.host_of(url)]
+    assert st["state"] == OPEN
+    assert st["retry_in"] == pytest.approx(120, abs=2)
+
+
+def test_other_server_errors_still_retry_quickly(server):
+    handler, url = server
+    handler.status = 502
+    with pytest.raises(requests.HTTPError):
+        session.safe_get(session.build_session(), url)
+    assert handler.hits == 3
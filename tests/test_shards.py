@@ -0,0 +1,111 @@
+"""两个 worker（各自一条连接）共用一个临时租约库：认领不重叠、过期租约被接手、只有一个报告者。"""
+import threading
+import time
+
+import pytest
+
+from utils.observation import PriceObservation
+from utils.shards import LeaseStore
+
+CYCLE = "2026-10-16T12:00"
+JOBS = [(site, f"M{i}") for site in ("LG", "Currys", "Amazon") for i in range(10)]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    path = tmp_path / "shards.sqlite3"
+    a, b = LeaseStore(path, lease_sec=60), LeaseStore(path, lease_sec=60)
+    for s in (a, b):
+        s.open_cycle(CYCLE, JOBS)                     # 两边都调用，目标只插入一次
+    yield a, b
+    a.close()
+    b.close()
+
+
+def _row(site, model):
+    return PriceObservation.make(site=site, model=model, price="£999.00", title=model,
+                                 url=f"https://example.com/{site}/{model}", in_stock=True)
+
+
+def test_concurrent_claims_never_overlap(stores):
+    claimed = {"w1": [], "w2": []}
+
+    def work(store, worker):
+        while True:
+            batch = store.claim(CYCLE, worker, limit=3)
+            if not batch:
+                return
+            claimed[worker] += batch
+            store.complete(CYCLE, worker, {job: [_row(*job)] for job in batch})
+
+    threads = [threading.Thread(target=work, args=(s, w)) for s, w in zip(stores, claimed)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not set(claimed["w1"]) & set(claimed["w2"])
+    assert sorted(claimed["w1"] + claimed["w2"]) == sorted(JOBS)
+    a, _ = stores
+    assert a.progress(CYCLE) == {"done": len(JOBS)}
+    merged, missing = a.merged(CYCLE)
+    assert [(r.site, r.model) for r in merged] == JOBS        # 按 all_jobs() 顺序合并
+    assert missing == []
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    path = tmp_path / "shards.sqlite3"
+    a, b = LeaseStore(path, lease_sec=0.05), LeaseStore(path, lease_sec=0.05)
+    a.open_cycle(CYCLE, JOBS[:2])
+
+    assert a.claim(CYCLE, "w1", limit=2) == JOBS[:2]
+    assert b.claim(CYCLE, "w2") == []                 # 租约还有效
+    assert not b.try_report(CYCLE, "w2")              # 有人还在抓，不能合并
+
+    time.sleep(0.1)                                   # w1 挂了，租约过期
+    assert b.claim(CYCLE, "w2", limit=2) == JOBS[:2]
+    assert a.complete(CYCLE, "w1", {job: [] for job in JOBS[:2]}) == 0    # 过期后交的结果不算
+    assert b.complete(CYCLE, "w2", {JOBS[0]: [], JOBS[1]: None}) == 2
+    assert b.workers(CYCLE) == {"w2": 2}
+    a.close()
+    b.close()
+
+
+def test_only_one_worker_reports(stores):
+    a, b = stores
+    for store, worker in ((a, "w1"), (b, "w2")):
+        while batch := store.claim(CYCLE, worker):
+            store.complete(CYCLE, worker, {job: [] for job in batch})
+    assert a.try_report(CYCLE, "w1")
+    assert not b.try_report(CYCLE, "w2")
+    assert not a.try_report(CYCLE, "w1")
+
+
+class _Stop(Exception):
+    pass
+
+
+def test_shard_loop_sleeps_to_next_slot_boundary(monkeypatch):
+    import main
+
+    slot = 20 * 60
+    finished = iter([100 * slot + 7 * 60 + 30, 101 * slot + 19 * 60])   # 每轮做完的时刻不一样
+    now = [100 * slot]
+    sleeps = []
+
+    def run_once(*a, interval_min):
+        assert interval_min == 20
+        now[0] = next(finished)
+
+    def sleep(sec):
+        sleeps.append(sec)
+        if len(sleeps) == 2:
+            raise _Stop
+
+    monkeypatch.setattr(main, "in_active_hours", lambda *a: True)
+    monkeypatch.setattr(main, "shard_run_once", run_once)
+    monkeypatch.setattr(main.time, "time", lambda: now[0])
+    monkeypatch.setattr(main.time, "sleep", sleep)
+    with pytest.raises(_Stop):
+        main.loop(20, 0, 23, 0, 0, shard=True)
+    assert sleeps == [12 * 60 + 30, 60]               # 都睡到下一个 20 分钟整点
@@ -0,0 +1,31 @@
+"""各站点指标的 site 标签统一用调度里的站点名（CATALOG_SITE），解析耗时才能和行数/失败数对上。"""
+import re
+from pathlib import Path
+
+import pytest
+
+import main
+from utils import session
+from utils.metrics import METRICS
+
+MANIFEST = Path(__file__).parent.parent / "bench" / "fixtures" / "urls.json"
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(session, "_OFFLINE", session.fixture_lookup(MANIFEST))
+
+
+@pytest.mark.parametrize("mode", ["serial", "pipeline"])
+def test_parse_seconds_uses_the_same_site_labels_as_row_counters(offline, mode):
+    METRICS.begin_cycle()
+    main.collect_jobs(main.all_jobs(), mode)
+    summary = METRICS.cycle_summary()
+
+    def sites(keys, name):
+        return set(re.findall(rf'^{name}{{.*site="([^"]*)"', "\n".join(keys), re.M))
+
+    parsed = sites(summary["timings"], "parse_seconds")
+    counted = sites(summary["counters"], "rows_total")
+    assert parsed == counted == set(main.scrapers)
+    METRICS.begin_cycle()
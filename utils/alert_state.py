@@ -0,0 +1,98 @@
+# utils/alert_state.py
+from __future__ import annotations
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+STATE_DB = Path(os.getenv("ALERT_STATE_DB", ".alert_state.sqlite3"))
+LEGACY_JSON = Path(".alert_state.json")      # 旧版状态文件，首次打开时导入
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_state (
+    model               TEXT PRIMARY KEY,
+    last_notified_price REAL NOT NULL,
+    last_site           TEXT,
+    last_url            TEXT,
+    ts                  TEXT
+);
+"""
+
+
+class AlertStateStore:
+    """
+    告警去重状态（SQLite，WAL）：
+    - 按型号主键查询，O(1)，与跟踪多少型号/站点无关
+    - update() 只 upsert 本次触发的型号，单事务提交，崩溃不会留下半个文件
+    - 多个进程/线程可共用同一个库（busy_timeout 等锁）
+    """
+
+    def __init__(self, path: Path = STATE_DB, legacy_json: Path | None = LEGACY_JSON):
+        self.path = Path(path)
+        self.legacy_json = legacy_json
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            self._import_legacy()
+        return self._conn
+
+    def _import_legacy(self):
+        if not self.legacy_json or not self.legacy_json.exists():
+            return
+        if self._conn.execute("SELECT 1 FROM alert_state LIMIT 1").fetchone():
+            return
+        try:
+            old = json.loads(self.legacy_json.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        self._upsert({m: v for m, v in old.items() if v.get("last_notified_price") is not None})
+
+    def _upsert(self, entries: dict[str, dict]):
+        with self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO alert_state (model, last_notified_price, last_site, last_url, ts)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(model) DO UPDATE SET
+                    last_notified_price = excluded.last_notified_price,
+                    last_site = excluded.last_site,
+                    last_url = excluded.last_url,
+                    ts = excluded.ts
+                """,
+                [(m, float(v["last_notified_price"]), v.get("last_site"), v.get("last_url"), v.get("ts"))
+                 for m, v in entries.items()],
+            )
+
+    def get(self, model: str) -> dict:
+        """返回 {last_notified_price, last_site, last_url, ts}；没通知过返回 {}。"""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT last_notified_price, last_site, last_url, ts FROM alert_state WHERE model = ?",
+                (model,),
+            ).fetchone()
+        return dict(row) if row else {}
+
+    def update(self, entries: dict[str, dict]):
+        """entries: {model: {last_notified_price, last_site, last_url, ts}}"""
+        if not entries:
+            return
+        with self._lock:
+            self._db()
+            self._upsert(entries)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+ALERT_STATE = AlertStateStore()
@@ -0,0 +1,116 @@
+# utils/archive.py
+from __future__ import annotations
+import os
+import gzip
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime
+
+from utils.metrics import METRICS
+
+# 原始响应存档（--record 写，--replay 读）。正文按 sha256 内容寻址、gzip 压缩，
+# 跨轮次相同的页面只存一份；索引放 SQLite，按 (url, 时间) 和轮次查。
+# 与 SHARD_DB 一样可能被多个 worker 共用，不开 WAL。
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "reports/archive"))
+COMPRESS_LEVEL = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    cycle TEXT    NOT NULL,          -- 轮次 id（分片模式下与 shard 的 cycle_id 相同）
+    ts    REAL    NOT NULL,
+    url   TEXT    NOT NULL,
+    sha   TEXT    NOT NULL,          -- 正文 sha256，对应 objects/<sha[:2]>/<sha>.gz
+    size  INTEGER NOT NULL           -- 未压缩字节数
+);
+CREATE INDEX IF NOT EXISTS idx_responses_url_ts ON responses(url, ts);
+CREATE INDEX IF NOT EXISTS idx_responses_cycle ON responses(cycle);
+"""
+
+
+def new_cycle_id() -> str:
+    return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+class ResponseArchive:
+    """
+    - begin_cycle() 之后 record(url, body) 把正文归到这一轮
+    - cycles(prefix) 列出存档里的轮次；lookup(cycle) 返回给 session.set_offline 用的 url -> html 函数
+    线程安全。
+    """
+
+    def __init__(self, root: Path = ARCHIVE_DIR):
+        self.root = Path(root)
+        self.cycle: str | None = None
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.root / "index.sqlite3", timeout=30,
+                                   isolation_level=None, check_same_thread=False)
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _blob(self, sha: str) -> Path:
+        return self.root / "objects" / sha[:2] / f"{sha}.gz"
+
+    def begin_cycle(self, cycle: str | None = None) -> str:
+        self.cycle = cycle or new_cycle_id()
+        return self.cycle
+
+    def record(self, url: str, body: str):
+        data = body.encode("utf-8")
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob(sha)
+        if path.exists():
+            METRICS.inc("archive_dedup_total")
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(gzip.compress(data, COMPRESS_LEVEL, mtime=0))
+            os.replace(tmp, path)
+            METRICS.inc("archive_bytes_total", len(data))
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO responses (cycle, ts, url, sha, size) VALUES (?, ?, ?, ?, ?)",
+                (self.cycle or new_cycle_id(), time.time(), url, sha, len(data)),
+            )
+
+    def load(self, sha: str) -> str:
+        return gzip.decompress(self._blob(sha).read_bytes()).decode("utf-8")
+
+    def cycles(self, prefix: str = "") -> list[tuple[str, int, float]]:
+        """[(cycle, 响应数, 第一个响应的时间)]，按时间先后；prefix 为空列出全部。"""
+        with self._lock:
+            return self._db().execute(
+                """SELECT cycle, COUNT(*), MIN(ts) FROM responses WHERE substr(cycle, 1, ?) = ?
+                   GROUP BY cycle ORDER BY MIN(ts)""",
+                (len(prefix), prefix),
+            ).fetchall()
+
+    def lookup(self, cycle: str):
+        """某一轮的 url -> html 取数函数；同一 url 在这一轮里有多次时取最后一次。"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT url, sha FROM responses WHERE cycle = ? ORDER BY ts", (cycle,)
+            ).fetchall()
+        index = dict(rows)
+
+        def lookup(url: str):
+            sha = index.get(url)
+            return self.load(sha) if sha else None
+        return lookup
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+ARCHIVE = ResponseArchive()
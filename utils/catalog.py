@@ -0,0 +1,51 @@
+# utils/catalog.py
+from __future__ import annotations
+import re
+
+from config import PRODUCTS
+
+
+def model_key(model: str) -> str:
+    """"LG OLED65C4" / "oled65c4" -> "OLED65C4"（去空白和连字符、大写、去品牌前缀）"""
+    key = re.sub(r"[\s\-_/]+", "", model or "").upper()
+    return key[2:] if key.startswith("LG") and len(key) > 2 else key
+
+
+class Catalog:
+    """
+    PRODUCTS 的索引：按型号、按 (站点, 型号) 都是一次 dict 查询。
+    调度只从这里生成 (site, model) 目标，站点不卖的型号不会产生请求；
+    scraper 也从这里取 url / 搜索词，不再各自维护一份型号表再逐个子串匹配。
+    """
+
+    def __init__(self, products: dict[str, dict]):
+        self._products = products
+        self._keys = {model_key(m): m for m in products}
+        self._by_site: dict[str, dict[str, dict]] = {}
+        for model, p in products.items():
+            for site, target in p.get("sites", {}).items():
+                self._by_site.setdefault(site, {})[model] = target
+
+    def resolve(self, model: str) -> str | None:
+        """把调用方给的型号写法映射成目录里的型号，不在目录里返回 None。"""
+        if model in self._products:
+            return model
+        return self._keys.get(model_key(model))
+
+    def target(self, site: str, model: str) -> dict | None:
+        """该站点抓这个型号的配置（url / query / group）；站点不卖返回 None。"""
+        m = self.resolve(model)
+        return self._by_site.get(site, {}).get(m) if m else None
+
+    def models(self, site: str | None = None) -> list[str]:
+        if site is None:
+            return list(self._products)
+        return list(self._by_site.get(site, {}))
+
+    def jobs(self, sites) -> list[tuple[str, str]]:
+        """全部有效的 (site, model) 目标，按 model × sites 的顺序。"""
+        return [(site, model) for model, p in self._products.items()
+                for site in sites if site in p.get("sites", {})]
+
+
+CATALOG = Catalog(PRODUCTS)
@@ -0,0 +1,150 @@
+# utils/circuit.py
+from __future__ import annotations
+import time
+import threading
+from collections import deque
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+
+FAILURE_THRESHOLD = 3               # 窗口内失败这么多次就断开
+FAILURE_WINDOW_SEC = 5 * 60
+COOLDOWN_SEC = 5 * 60               # 断开后多久放一个探测请求
+MAX_COOLDOWN_SEC = 2 * 3600         # 探测连续失败时冷却翻倍，最多到这么久
+FAILURE_STATUSES = {429, 500, 502, 503, 504}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(Exception):
+    """host 处于断开状态，本次请求直接跳过。"""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"{host} circuit open, retry in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def parse_retry_after(value: str | None, now: float | None = None) -> float | None:
+    """Retry-After 可以是秒数或 HTTP 日期；返回还要等多少秒，解析不了返回 None。"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = time.time() if now is None else now
+    return max(0.0, when.timestamp() - now)
+
+
+class _HostState:
+    __slots__ = ("state", "failures", "open_until", "cooldown", "probe_owner", "last_error")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures: deque[float] = deque()
+        self.open_until = 0.0
+        self.cooldown = COOLDOWN_SEC
+        self.probe_owner: int | None = None
+        self.last_error: str | None = None
+
+
+class CircuitBreakers:
+    """
+    按 host 的熔断器，线程安全：
+    - closed：正常放行；FAILURE_WINDOW_SEC 内失败 FAILURE_THRESHOLD 次 -> open
+    - open：直接抛 CircuitOpen，不发请求也不抖动；冷却结束后 -> half_open
+    - half_open：只放一个线程去探测，成功 -> closed，失败 -> 重新 open 且冷却翻倍
+    响应带 Retry-After（429/503 常见）时立即 open，至少等到对方要求的时间。
+    进程常驻（--loop）时状态跨轮次保留。
+    """
+
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, window: float = FAILURE_WINDOW_SEC,
+                 cooldown: float = COOLDOWN_SEC, max_cooldown: float = MAX_COOLDOWN_SEC):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._hosts: dict[str, _HostState] = {}
+
+    def _host(self, host: str) -> _HostState:
+        st = self._hosts.get(host)
+        if st is None:
+            st = self._hosts[host] = _HostState()
+            st.cooldown = self.cooldown
+        return st
+
+    def before(self, host: str):
+        """请求前调用；host 不可用时抛 CircuitOpen。同一线程重复调用不会占用多个探测名额。"""
+        me = threading.get_ident()
+        now = time.monotonic()
+        with self._lock:
+            st = self._host(host)
+            if st.state == OPEN and now >= st.open_until:
+                st.state, st.probe_owner = HALF_OPEN, None
+            if st.state == OPEN:
+                raise CircuitOpen(host, st.open_until - now)
+            if st.state == HALF_OPEN:
+                if st.probe_owner is None:
+                    st.probe_owner = me
+                elif st.probe_owner != me:
+                    raise CircuitOpen(host, 0)
+
+    def release(self, host: str):
+        """请求没有结果（比如被本轮截止时间截断）：交还探测名额，不算成功也不算失败。"""
+        with self._lock:
+            st = self._host(host)
+            if st.probe_owner == threading.get_ident():
+                st.probe_owner = None
+
+    def success(self, host: str):
+        with self._lock:
+            st = self._host(host)
+            st.state, st.probe_owner = CLOSED, None
+            st.failures.clear()
+            st.cooldown = self.cooldown
+            st.last_error = None
+
+    def failure(self, host: str, error: str, retry_after: float | None = None):
+        now = time.monotonic()
+        with self._lock:
+            st = self._host(host)
+            st.last_error = error
+            while st.failures and now - st.failures[0] >= self.window:
+                st.failures.popleft()
+            st.failures.append(now)
+
+            if st.state == HALF_OPEN:
+                st.cooldown = min(self.max_cooldown, st.cooldown * 2)
+            elif retry_after is None and len(st.failures) < self.threshold:
+                return
+            wait = st.cooldown if retry_after is None else min(self.max_cooldown, max(retry_after, 1.0))
+            st.state, st.probe_owner = OPEN, None
+            st.open_until = max(st.open_until, now + wait)
+
+    def snapshot(self) -> dict[str, dict]:
+        """写进本轮摘要：{host: {state, failures, retry_in, last_error}}"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                host: {
+                    "state": st.state,
+                    "failures": sum(1 for t in st.failures if now - t < self.window),
+                    "retry_in": round(max(0.0, st.open_until - now), 1) if st.state == OPEN else 0,
+                    "last_error": st.last_error,
+                }
+                for host, st in sorted(self._hosts.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+BREAKERS = CircuitBreakers()
+
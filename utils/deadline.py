@@ -0,0 +1,33 @@
+# utils/deadline.py
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+
+# 本轮截止时间（time.monotonic()），None 表示不限。全局而不是 thread-local：
+# 并发模式下抓取跑在线程池里，也要看到同一个截止时间。
+_DEADLINE: float | None = None
+
+
+class DeadlineExceeded(Exception):
+    """本轮时间预算用完，剩下的抓取不再发出。"""
+
+
+def time_left() -> float | None:
+    return None if _DEADLINE is None else _DEADLINE - time.monotonic()
+
+
+def check_deadline():
+    left = time_left()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"cycle deadline passed {-left:.1f}s ago")
+
+
+@contextmanager
+def cycle_deadline(budget_sec: float | None):
+    """在 budget_sec 秒的预算内执行一轮；budget_sec 为 None/0 时不限。"""
+    global _DEADLINE
+    _DEADLINE = time.monotonic() + budget_sec if budget_sec else None
+    try:
+        yield
+    finally:
+        _DEADLINE = None
@@ -0,0 +1,46 @@
+# utils/fast_extract.py
+"""
+不建 DOM 的快速提取：直接在原始 HTML 上用正则找 <title>、JSON-LD 和 sfDataLayer.push(...)。
+任何一步拿不到结果都返回 None，由调用方退回 BeautifulSoup 路径。
+"""
+from __future__ import annotations
+import re
+import json
+import html as htmllib
+
+TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title\s*>", re.I | re.S)
+JSONLD_RE = re.compile(
+    r"<script[^>]*\btype\s*=\s*[\"']application/ld\+json[\"'][^>]*>(.*?)</script\s*>",
+    re.I | re.S,
+)
+SF_LAYER_RE = re.compile(r"sfDataLayer\.push\((\{.*?\})\);", re.S)
+
+
+def find_title(html: str) -> str | None:
+    m = TITLE_RE.search(html)
+    if not m:
+        return None
+    # 与 get_text(strip=True) 对齐：去标签、解实体、去首尾空白
+    text = htmllib.unescape(re.sub(r"<[^>]+>", "", m.group(1))).strip()
+    return text or None
+
+
+def iter_jsonld(html: str):
+    """逐个产出能解析的 JSON-LD 对象（list 包裹的也原样产出）。"""
+    for m in JSONLD_RE.finditer(html):
+        try:
+            yield json.loads(m.group(1))
+        except Exception:
+            continue
+
+
+def iter_sf_layer(html: str):
+    """逐个产出 sfDataLayer.push({...}) 里能解析的 dict。"""
+    for m in SF_LAYER_RE.finditer(html):
+        payload = m.group(1)
+        if "</script" in payload:        # 跨了 <script> 边界，说明不是同一段脚本
+            continue
+        try:
+            yield json.loads(payload)
+        except Exception:
+            continue
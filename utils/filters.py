@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 
 NEGATIVE_KWS = re.compile(
     r'(stand|bracket|mount|wall|cover|remote|protector|screen|glass|soundbar|hdmi|cable|monitor|'
@@ -10,45 +11,49 @@ RRP_PAT = re.compile(r'\b(RRP|List Price|Was|R\.R\.P)\b', re.I)
 def normalize(text: str) -> str:
     return re.sub(r"[\s\-_/]+", "", text or "").upper()
 
+class ProductMatcher:
+    """
+    针对一个 model_query 预编译好的标题匹配器，语义与原 looks_like_target 一致：
+    品牌/型号前缀、系列、尺寸、负面关键词合成一个带前瞻的正则，一次 search 判定。
+    """
+
+    def __init__(self, model_query: str):
+        q = (model_query or "").upper()
+
+        # ---- 1. 品牌/型号 ----
+        brand = r"(?=.*?(?:LG|OLED(?:55|65)(?:C4|B4)))"
+
+        # ---- 2. 系列 ----
+        series_tokens = [tok for tok in ("C4", "B4") if tok in q] or ["C4", "B4"]
+        series = rf"(?=.*?(?:{'|'.join(series_tokens)}))"
+
+        # ---- 3. 尺寸 ----
+        # 从 model_query 抽尺寸（默认65）
+        m = re.search(r"(55|65)", model_query or "")
+        size = m.group(1) if m else "65"
+        sizes = rf"(?=.*?(?:\b{size}\b|{size}\"|\b{size}-?INCH\b|\b{size}IN\b|OLED{size}))"
+
+        # ---- 4. 负面关键词 ----
+        negative = rf"(?!.*?{NEGATIVE_KWS.pattern})"
+
+        self.model_query = model_query
+        self.pattern = re.compile(brand + series + sizes + negative, re.I | re.S)
+
+    def matches(self, title: str) -> bool:
+        if not title:
+            return False
+        return self.pattern.match(title.upper()) is not None
+
+    def classify(self, titles) -> list[bool]:
+        """批量判定，返回与 titles 等长的布尔掩码。"""
+        match = self.pattern.match
+        return [bool(t) and match(t.upper()) is not None for t in titles]
+
+
+@lru_cache(maxsize=1024)
+def get_matcher(model_query: str) -> ProductMatcher:
+    return ProductMatcher(model_query)
+
+
 def looks_like_target(title: str, model_query: str) -> bool:
-    if not title:
-        return False
-    t = title.upper()
-
-    # ---- 1. 品牌/型号 ----
-    has_lg = "LG" in t
-    has_model_prefix = bool(re.search(r"OLED(55|65)(C4|B4)", t))
-    if not (has_lg or has_model_prefix):
-        return False
-
-    # ---- 2. 系列 ----
-    series_tokens = []
-    if "C4" in model_query.upper():
-        series_tokens.append("C4")
-    if "B4" in model_query.upper():
-        series_tokens.append("B4")
-    if not series_tokens:
-        series_tokens = ["C4", "B4"]
-
-    if not any(tok in t for tok in series_tokens):
-        return False
-
-    # ---- 3. 尺寸 ----
-    # 从 model_query 抽尺寸（默认65）
-    m = re.search(r"(55|65)", model_query)
-    size = m.group(1) if m else "65"
-    size_patterns = [
-        rf"\b{size}\b",
-        rf"{size}\"",
-        rf"\b{size}-?INCH\b",
-        rf"\b{size}IN\b",
-        rf"OLED{size}"
-    ]
-    if not any(re.search(p, t, re.I) for p in size_patterns):
-        return False
-
-    # ---- 4. 负面关键词 ----
-    if NEGATIVE_KWS.search(title):
-        return False
-
-    return True
+    return get_matcher(model_query).matches(title)
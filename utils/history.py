@@ -0,0 +1,126 @@
+# utils/history.py
+from __future__ import annotations
+import os
+import math
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+from utils.observation import PriceObservation
+
+HISTORY_DB = Path(os.getenv("HISTORY_DB", "reports/history.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    ts        INTEGER NOT NULL,      -- unix 秒
+    site      TEXT    NOT NULL,
+    model     TEXT    NOT NULL,
+    price_num REAL,
+    price     TEXT,
+    in_stock  INTEGER NOT NULL,
+    title     TEXT,
+    url       TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_obs_model_site_ts ON observations(model, site, ts);
+CREATE INDEX IF NOT EXISTS idx_obs_model_ts ON observations(model, ts);
+-- “有货最低价”查询专用的部分索引
+CREATE INDEX IF NOT EXISTS idx_obs_instock ON observations(model, ts, price_num)
+    WHERE in_stock = 1 AND price_num IS NOT NULL;
+"""
+
+
+def _num(x):
+    if x is None or (isinstance(x, float) and math.isnan(x)):
+        return None
+    return float(x)
+
+
+class PriceHistory:
+    """
+    只追加的价格历史库（SQLite，WAL）：
+    - append(rows) 每轮一次事务批量写入
+    - lowest_in_stock(days) / price_series(model) 走索引，查一年的 20 分钟快照也是毫秒级
+    """
+
+    def __init__(self, path: Path = HISTORY_DB):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def append(self, rows: list[PriceObservation], ts: float | None = None) -> int:
+        """写入一轮的观测，返回写入条数。"""
+        if not rows:
+            return 0
+        stamp = int(ts if ts is not None else time.time())
+        data = [(
+            stamp,
+            r.site,
+            r.model,
+            _num(r.price_num),
+            r.price,
+            1 if r.in_stock else 0,
+            r.title,
+            r.url,
+        ) for r in rows]
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany("INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", data)
+        return len(data)
+
+    def has_snapshot(self, ts: float) -> bool:
+        """这一秒已经写过观测（回放补历史时避免重复写入同一轮）。"""
+        with self._lock:
+            return self._db().execute(
+                "SELECT 1 FROM observations WHERE ts = ? LIMIT 1", (int(ts),)
+            ).fetchone() is not None
+
+    def lowest_in_stock(self, days: float = 30) -> dict:
+        """最近 days 天每个型号的有货最低价：{model: {price_num, price, site, url, ts}}"""
+        since = int(time.time() - days * 86400)
+        # SQLite 的 MIN() 聚合会把同一行的其它裸列一起带出来
+        sql = """
+            SELECT model, MIN(price_num) AS price_num, price, site, url, ts
+            FROM observations INDEXED BY idx_obs_instock
+            WHERE in_stock = 1 AND price_num IS NOT NULL AND ts >= ?
+            GROUP BY model
+        """
+        with self._lock:
+            rows = self._db().execute(sql, (since,)).fetchall()
+        return {r["model"]: {k: r[k] for k in ("price_num", "price", "site", "url", "ts")} for r in rows}
+
+    def price_series(self, model: str, site: str | None = None, days: float | None = None) -> list[dict]:
+        """某型号的价格序列（按时间升序），可按站点 / 最近 N 天过滤。"""
+        sql = "SELECT ts, site, price_num, price, in_stock FROM observations WHERE model = ?"
+        args: list = [model]
+        if site is not None:
+            sql += " AND site = ?"
+            args.append(site)
+        if days is not None:
+            sql += " AND ts >= ?"
+            args.append(int(time.time() - days * 86400))
+        sql += " ORDER BY ts"
+        with self._lock:
+            rows = self._db().execute(sql, args).fetchall()
+        return [dict(r) for r in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+HISTORY = PriceHistory()
@@ -0,0 +1,157 @@
+# utils/http_cache.py
+from __future__ import annotations
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("HTTP_CACHE_DIR", ".http_cache"))
+CACHE_TTL_SEC = 7 * 24 * 3600          # 超过这个时间没刷新过的条目直接丢弃
+CACHE_MAX_BYTES = 50 * 1024 * 1024     # 正文总大小上限，超出按最近使用时间淘汰
+
+
+class HttpCache:
+    """
+    磁盘 HTTP 缓存（条件请求用）：
+    - 每个 URL 一对文件：<key>.html 正文，<key>.json 元数据（ETag / Last-Modified / 解析结果）
+    - 请求时带 If-None-Match / If-Modified-Since，304 时复用正文和上次的解析结果
+    - 解析结果带解析器版本，版本不同就当没有（解析器修了之后，从不变化的页面也会重新解析）
+    - TTL 按最初完整下载的时间算，304 不续期；过期后重新完整下载 + 解析。总大小超限按最近使用淘汰
+    - hits/misses 计数
+    """
+
+    def __init__(self, root: Path = CACHE_DIR, ttl: float = CACHE_TTL_SEC, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0           # 304，复用缓存
+        self.misses = 0         # 无缓存或内容有变化，完整下载
+        self.evictions = 0
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        k = self._key(url)
+        return self.root / f"{k}.json", self.root / f"{k}.html"
+
+    def _read_meta(self, meta_path: Path) -> dict | None:
+        try:
+            return json.loads(meta_path.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+
+    def _write_atomic(self, path: Path, text: str):
+        tmp = path.with_suffix(path.suffix + f".{threading.get_ident()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _drop(self, url: str):
+        for p in self._paths(url):
+            p.unlink(missing_ok=True)
+
+    def lookup(self, url: str) -> dict | None:
+        """返回未过期的元数据（含 body_path），否则 None。"""
+        meta_path, body_path = self._paths(url)
+        meta = self._read_meta(meta_path)
+        if not meta or not body_path.exists():
+            return None
+        if time.time() - meta.get("stored_at", 0) > self.ttl:
+            self._drop(url)
+            return None
+        return meta
+
+    def conditional_headers(self, meta: dict | None) -> dict:
+        if not meta:
+            return {}
+        h = {}
+        if meta.get("etag"):
+            h["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            h["If-Modified-Since"] = meta["last_modified"]
+        return h
+
+    def load_body(self, url: str) -> str | None:
+        _, body_path = self._paths(url)
+        try:
+            return body_path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def store(self, url: str, text: str, etag: str | None, last_modified: str | None):
+        """200：写入新正文，清掉旧的解析结果。没有任何校验头的响应不缓存。"""
+        with self._lock:
+            self.misses += 1
+        if not (etag or last_modified):
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        meta_path, body_path = self._paths(url)
+        now = time.time()
+        self._write_atomic(body_path, text)
+        self._write_atomic(meta_path, json.dumps({
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": now,
+            "used_at": now,
+            "size": len(text.encode("utf-8")),
+            "parsed": None,
+        }, ensure_ascii=False))
+        self.evict()
+
+    def revalidated(self, url: str, meta: dict):
+        """304：更新最近使用时间（淘汰用），计一次命中；stored_at 不动，TTL 不续期。"""
+        with self._lock:
+            self.hits += 1
+        meta_path, _ = self._paths(url)
+        meta["used_at"] = time.time()
+        self._write_atomic(meta_path, json.dumps(meta, ensure_ascii=False))
+
+    def parsed(self, url: str, version: int):
+        """上次的解析结果；没有、或是别的解析器版本存的，返回 None（调用方重新解析）。"""
+        meta = self._read_meta(self._paths(url)[0])
+        if not meta or meta.get("parsed_version") != version:
+            return None
+        return meta.get("parsed")
+
+    def save_parsed(self, url: str, value, version: int):
+        meta_path, _ = self._paths(url)
+        meta = self._read_meta(meta_path)
+        if meta is None:
+            return
+        meta["parsed"] = value
+        meta["parsed_version"] = version
+        self._write_atomic(meta_path, json.dumps(meta, ensure_ascii=False))
+
+    def evict(self):
+        """先删过期条目，再按 used_at 从旧到新删，直到总大小不超过 max_bytes。"""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for meta_path in self.root.glob("*.json"):
+                meta = self._read_meta(meta_path)
+                if not meta or now - meta.get("stored_at", 0) > self.ttl:
+                    meta_path.unlink(missing_ok=True)
+                    meta_path.with_suffix(".html").unlink(missing_ok=True)
+                    self.evictions += 1
+                    continue
+                entries.append((meta.get("used_at", 0), meta.get("size", 0), meta_path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, meta_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                meta_path.unlink(missing_ok=True)
+                meta_path.with_suffix(".html").unlink(missing_ok=True)
+                total -= size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+HTTP_CACHE = HttpCache()
@@ -0,0 +1,226 @@
+# utils/mailer.py
+from __future__ import annotations
+import os
+import json
+import time
+import uuid
+import smtplib
+import threading
+from pathlib import Path
+from email.message import EmailMessage
+
+from filelock import FileLock, Timeout
+
+from config import SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, MAIL_TO, MAIL_FROM
+
+OUTBOX_DIR = Path(os.getenv("ALERT_OUTBOX", ".outbox"))
+DIGEST_WINDOW_SEC = int(os.getenv("ALERT_DIGEST_SEC", "0"))   # >0 时把窗口内的告警合并成一封
+POLL_SEC = 5
+SMTP_TIMEOUT = 20
+IDLE_NOOP_SEC = 60          # 连接空闲超过这个时间，发之前先 NOOP 探活
+RETRY_BASE_SEC = 30
+RETRY_MAX_SEC = 30 * 60
+MAX_ATTEMPTS = 20           # 超过后移到 outbox/dead/，不再重试
+
+
+def build_message(subject: str, html: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = MAIL_FROM
+    msg["To"] = ", ".join(MAIL_TO)
+    msg.set_content("HTML only.")
+    msg.add_alternative(html, subtype="html")
+    return msg
+
+
+class Mailer:
+    """
+    后台投递告警邮件：
+    - enqueue() 只把消息原子写进磁盘 outbox，立即返回，不阻塞抓取
+    - 后台线程复用一条已登录的 SMTP 连接，断开自动重连；失败按指数退避重试
+    - digest_window > 0 时，窗口内的多条告警合成一封摘要
+    - outbox 在磁盘上，进程退出后下次启动继续投递；多个进程共用 outbox 时用文件锁保证只有一个在发
+    """
+
+    def __init__(self, outbox: Path = OUTBOX_DIR, digest_window: int = DIGEST_WINDOW_SEC,
+                 host: str = SMTP_HOST, port: int = SMTP_PORT,
+                 user: str | None = SMTP_USER, password: str | None = SMTP_PASS,
+                 starttls: bool = True):
+        self.outbox = Path(outbox)
+        self.digest_window = digest_window
+        self.host, self.port = host, port
+        self.user, self.password = user, password
+        self.starttls = starttls
+
+        self._conn: smtplib.SMTP | None = None
+        self._last_used = 0.0
+        self._send_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ---------------- outbox ----------------
+    def enqueue(self, subject: str, html: str) -> Path:
+        self.outbox.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        path = self.outbox / f"{int(now * 1000)}-{uuid.uuid4().hex[:8]}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "subject": subject, "html": html,
+            "created": now, "attempts": 0, "next_try": now,
+        }, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        self.start()
+        self._wake.set()
+        return path
+
+    def pending(self) -> list[tuple[Path, dict]]:
+        """按入队先后；同一毫秒入队的文件名前缀相同，不能只靠文件名排序。"""
+        out = []
+        for p in self.outbox.glob("*.json"):
+            try:
+                out.append((p, json.loads(p.read_text(encoding="utf-8"))))
+            except Exception:
+                continue
+        out.sort(key=lambda item: (item[1].get("created", 0), item[0].name))
+        return out
+
+    # ---------------- SMTP 连接 ----------------
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if self.starttls:
+            conn.starttls()
+        if self.user:
+            conn.login(self.user, self.password)
+        return conn
+
+    def _ensure_conn(self) -> smtplib.SMTP:
+        if self._conn is not None and time.time() - self._last_used > IDLE_NOOP_SEC:
+            try:
+                if self._conn.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("noop failed")
+            except Exception:
+                self._close()
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _send(self, subject: str, html: str):
+        msg = build_message(subject, html)
+        try:
+            self._ensure_conn().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # 长连接被服务器关掉了：重连一次再发
+            self._close()
+            self._ensure_conn().send_message(msg)
+        self._last_used = time.time()
+
+    # ---------------- 投递 ----------------
+    def _digest(self, batch: list[dict]) -> tuple[str, str]:
+        if len(batch) == 1:
+            return batch[0]["subject"], batch[0]["html"]
+        subject = f"Deals digest ({len(batch)}): " + " | ".join(m["subject"].removeprefix("Deals: ") for m in batch)
+        html = "<hr>".join(m["html"] for m in batch)
+        return subject, html
+
+    def _retry_later(self, items: list[tuple[Path, dict]], err: Exception):
+        now = time.time()
+        for p, m in items:
+            m["attempts"] += 1
+            m["last_error"] = str(err)
+            if m["attempts"] >= MAX_ATTEMPTS:
+                dead = self.outbox / "dead"
+                dead.mkdir(exist_ok=True)
+                os.replace(p, dead / p.name)
+                continue
+            m["next_try"] = now + min(RETRY_BASE_SEC * 2 ** (m["attempts"] - 1), RETRY_MAX_SEC)
+            tmp = p.with_suffix(".tmp")
+            tmp.write_text(json.dumps(m, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, p)
+
+    def deliver_ready(self, force: bool = False) -> int | None:
+        """
+        发送所有到期的消息，返回成功条数；outbox 正被别处投递时返回 None。
+        force=True 时忽略摘要窗口和退避时间（--once 退出前用）。
+        """
+        if not self.outbox.exists():
+            return 0
+        try:
+            lock = FileLock(str(self.outbox / ".lock"), timeout=0)
+            lock.acquire()
+        except Timeout:
+            return None         # 另一个线程/进程正在投递
+        try:
+            with self._send_lock:
+                now = time.time()
+                ready = [(p, m) for p, m in self.pending() if force or m.get("next_try", 0) <= now]
+                if not ready:
+                    return 0
+
+                if self.digest_window > 0:
+                    if not force and now - min(m["created"] for _, m in ready) < self.digest_window:
+                        return 0
+                    groups = [ready]
+                else:
+                    groups = [[item] for item in ready]
+
+                sent = 0
+                for group in groups:
+                    try:
+                        self._send(*self._digest([m for _, m in group]))
+                    except Exception as e:
+                        print(f"[ALERT][ERROR] 邮件投递失败，稍后重试：{e}")
+                        self._close()
+                        self._retry_later(group, e)
+                        continue
+                    for p, _ in group:
+                        p.unlink(missing_ok=True)
+                    sent += len(group)
+                return sent
+        finally:
+            lock.release()
+
+    # ---------------- 后台线程 ----------------
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(POLL_SEC)
+            self._wake.clear()
+            try:
+                self.deliver_ready()
+            except Exception as e:
+                print(f"[ALERT][ERROR] 投递线程异常：{e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="mailer", daemon=True)
+            self._thread.start()
+
+    def drain(self, timeout: float = 60) -> bool:
+        """
+        强制投递一次（忽略摘要窗口）；outbox 正被占用时等到 timeout。
+        返回是否已清空，没发出去的留在 outbox 里下次再发。
+        """
+        deadline = time.time() + timeout
+        while self.deliver_ready(force=True) is None and time.time() < deadline:
+            time.sleep(0.5)
+        return not self.pending()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=SMTP_TIMEOUT)
+        with self._send_lock:
+            self._close()
+
+
+MAILER = Mailer()
@@ -0,0 +1,155 @@
+# utils/metrics.py
+from __future__ import annotations
+import os
+import json
+import time
+import bisect
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_DIR = Path(os.getenv("METRICS_DIR", "reports"))
+PROM_FILE = "metrics.prom"                  # Prometheus textfile 格式（node_exporter textfile collector 可直接读）
+SUMMARY_FILE = "cycle_summary.jsonl"        # 每轮一行 JSON
+
+# 延迟直方图的桶（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt(name: str, labels: tuple, extra: tuple = ()) -> str:
+    items = labels + extra
+    if not items:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class _Hist:
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(BUCKETS, v)] += 1
+        self.sum += v
+        self.count += 1
+        self.max = max(self.max, v)
+
+
+class Metrics:
+    """
+    进程内指标：直方图（延迟）+ 计数器（字节、重试、行数），线程安全。
+    同时维护累计值（导出 Prometheus）和本轮值（每轮结束写一行 JSON 摘要后清零）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist: dict[tuple, _Hist] = {}
+        self._counters: dict[tuple, float] = {}
+        self._cycle_hist: dict[tuple, _Hist] = {}
+        self._cycle_counters: dict[tuple, float] = {}
+        self._notes: dict[str, object] = {}
+        self._cycle_started = time.time()
+
+    def observe(self, name: str, value: float, **labels):
+        k = _key(name, labels)
+        with self._lock:
+            self._hist.setdefault(k, _Hist()).observe(value)
+            self._cycle_hist.setdefault(k, _Hist()).observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        k = _key(name, labels)
+        with self._lock:
+            self._counters[k] = self._counters.get(k, 0) + value
+            self._cycle_counters[k] = self._cycle_counters.get(k, 0) + value
+
+    def note(self, key: str, value):
+        """往本轮摘要里附加任意信息（例如站点健康状态）。"""
+        with self._lock:
+            self._notes[key] = value
+
+    def cycle_count(self, name: str) -> float:
+        """本轮某个计数器在所有标签上的合计。"""
+        with self._lock:
+            return sum(v for (n, _), v in self._cycle_counters.items() if n == name)
+
+    @contextmanager
+    def timed(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    # ---------------- 导出 ----------------
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            hists = sorted(self._hist.items())
+            counters = sorted(self._counters.items())
+        typed = set()
+        for (name, labels), h in hists:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            acc = 0
+            for bound, c in zip(BUCKETS, h.counts):
+                acc += c
+                lines.append(f"{_fmt(name + '_bucket', labels, (('le', str(bound)),))} {acc}")
+            lines.append(f"{_fmt(name + '_bucket', labels, (('le', '+Inf'),))} {h.count}")
+            lines.append(f"{_fmt(name + '_sum', labels)} {h.sum:.6f}")
+            lines.append(f"{_fmt(name + '_count', labels)} {h.count}")
+        for (name, labels), v in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{_fmt(name, labels)} {v:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, outdir: Path = METRICS_DIR):
+        Path(outdir).mkdir(parents=True, exist_ok=True)
+        path = Path(outdir) / PROM_FILE
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(self.prometheus_text(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def cycle_summary(self) -> dict:
+        with self._lock:
+            hist = {_fmt(n, l): {"count": h.count, "sum": round(h.sum, 4), "max": round(h.max, 4)}
+                    for (n, l), h in sorted(self._cycle_hist.items())}
+            counters = {_fmt(n, l): v for (n, l), v in sorted(self._cycle_counters.items())}
+            notes = dict(self._notes)
+        return {
+            "started": datetime.fromtimestamp(self._cycle_started).isoformat(timespec="seconds"),
+            "duration_sec": round(time.time() - self._cycle_started, 3),
+            "timings": hist,
+            "counters": counters,
+            **notes,
+        }
+
+    def begin_cycle(self):
+        with self._lock:
+            self._cycle_hist.clear()
+            self._cycle_counters.clear()
+            self._notes.clear()
+            self._cycle_started = time.time()
+
+    def end_cycle(self, outdir: Path = METRICS_DIR) -> dict:
+        """写 Prometheus 文件 + 追加一行本轮 JSON 摘要，然后清空本轮数据。"""
+        summary = self.cycle_summary()
+        self.write_prometheus(outdir)
+        with open(Path(outdir) / SUMMARY_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary, ensure_ascii=False, default=str) + "\n")
+        self.begin_cycle()
+        return summary
+
+
+METRICS = Metrics()
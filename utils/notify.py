@@ -1,25 +1,17 @@
 # utils/notify.py
 from __future__ import annotations
-import json
-from pathlib import Path
-from email.message import EmailMessage
+import os
 from datetime import datetime
 
 import pandas as pd
-from config import THRESHOLDS, SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, MAIL_TO, MAIL_FROM
+from utils.report import best_index
+from utils.observation import PriceObservation
+from utils.mailer import MAILER, build_message
+from utils.alert_state import ALERT_STATE
+from config import THRESHOLDS, SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS
 
-STATE_PATH = Path(".alert_state.json")
-
-def _load_state():
-    if STATE_PATH.exists():
-        try:
-            return json.loads(STATE_PATH.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
-    return {}
-
-def _save_state(state: dict):
-    STATE_PATH.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+# 1：写入 outbox 由后台线程投递（不阻塞本轮）；0：在本轮里同步发送
+ALERT_ASYNC = os.getenv("ALERT_ASYNC", "1") == "1"
 
 def best_prices(df: pd.DataFrame) -> dict:
     """
@@ -29,21 +21,17 @@ def best_prices(df: pd.DataFrame) -> dict:
     """
     out = {}
     # 价格必须能比较
-    dfx = df.dropna(subset=["price_num"]).copy()
-    if dfx.empty:
+    if df.empty or "price_num" not in df.columns:
         return out
 
     # 只计算有货的
-    if "in_stock" not in dfx.columns:
+    if "in_stock" not in df.columns:
         # 若你希望在缺失 in_stock 时仍参与比较，可在此放宽逻辑；目前严格要求。
         return out
-    dfx = dfx[dfx["in_stock"].fillna(False).astype(bool)]
-    if dfx.empty:
-        return out
 
-    for model, g in dfx.groupby("model"):
-        row = g.sort_values("price_num", ascending=True).iloc[0]
-        out[str(model)] = {
+    idx = best_index(df, in_stock_only=True)
+    for row in df.loc[idx].to_dict("records"):
+        out[str(row["model"])] = {
             "price_num": float(row["price_num"]),
             "price": str(row.get("price", row["price_num"])),
             "site": str(row.get("site", "")),
@@ -88,28 +76,108 @@ def _build_email_html(triggered: dict) -> str:
 
 def _send_email(subject: str, html: str):
     import smtplib
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = MAIL_FROM
-    msg["To"] = ", ".join(MAIL_TO)
-    msg.set_content("HTML only.")
-    msg.add_alternative(html, subtype="html")
+    msg = build_message(subject, html)
 
     with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as s:
         s.starttls()
         s.login(SMTP_USER, SMTP_PASS)
         s.send_message(msg)
 
+def _is_new_low(model: str, price: float, delta_step: float) -> bool:
+    """去重：没通知过，或比上次通知价更低 >= delta_step。"""
+    last = ALERT_STATE.get(model).get("last_notified_price")
+    return last is None or price <= float(last) - float(delta_step)
+
+def _deliver(triggered: dict, verbose: bool = False) -> bool:
+    """发邮件（或进 outbox），成功后更新去重状态（只写本次触发的型号）。"""
+    try:
+        subject = _build_email_subject(triggered)
+        html = _build_email_html(triggered)
+        if ALERT_ASYNC:
+            MAILER.enqueue(subject, html)
+        else:
+            _send_email(subject, html)
+        if verbose:
+            print("[ALERT] 邮件已提交。" if ALERT_ASYNC else "[ALERT] 邮件已发送。")
+    except Exception as e:
+        print(f"[ALERT][ERROR] 发送邮件失败：{e}")
+        return False
+
+    ts = datetime.now().isoformat(timespec="seconds")
+    ALERT_STATE.update({
+        m: {
+            "last_notified_price": info["price_num"],
+            "last_site": info["site"],
+            "last_url": info["url"],
+            "ts": ts,
+        } for m, info in triggered.items()
+    })
+    return True
+
+class EarlyAlerter:
+    """
+    边抓边判定的告警：每个目标抓完就 feed 它的行，某型号本轮的有货最低价一低于阈值、
+    且通过 delta_step 去重，马上发，不等整轮结束。
+    与 check_and_notify 共用 ALERT_STATE：轮末的完整判定只会在价格又低了 delta_step 以上时再发。
+    只在调度线程里调用（collect_jobs 的 on_result 回调），不做加锁。
+    """
+
+    def __init__(self, delta_step: float = 1.0, dry_run: bool = False):
+        self.delta_step = delta_step
+        self.dry_run = dry_run
+        self.best: dict[str, dict] = {}         # 本轮已见到的低于阈值的有货最低价
+        self.fired: dict[str, dict] = {}        # 本轮已提前发出的
+
+    def feed(self, rows: list[PriceObservation]) -> dict:
+        """返回这次提前触发的型号。"""
+        candidates = {}
+        for r in rows:
+            p = r.price_num
+            limit = THRESHOLDS.get(r.model)
+            if not r.in_stock or p is None or limit is None or p >= float(limit):
+                continue
+            if r.model in self.best and self.best[r.model]["price_num"] <= p:
+                continue
+            self.best[r.model] = candidates[r.model] = {
+                "price_num": p,
+                "price": str(r.price if r.price is not None else p),
+                "site": r.site,
+                "url": str(r.url or ""),
+                "title": str(r.title or ""),
+            }
+
+        due = {m: info for m, info in candidates.items() if _is_new_low(m, info["price_num"], self.delta_step)}
+        if not due or not (self.dry_run or _deliver(due)):
+            return {}
+        self.fired.update(due)
+        return due
+
+def pending_alerts(df: pd.DataFrame, delta_step: float = 1.0) -> dict:
+    """
+    低于阈值、但去重状态里还没记下的型号，也就是欠着没提交成功的告警。
+    通知之后调用：非空说明投递失败了，调用方不应该把这一轮当作“已处理”。
+    """
+    if df.empty or not {"model", "price_num", "in_stock"} <= set(df.columns):
+        return {}
+    return {
+        m: info for m, info in best_prices(df).items()
+        if m in THRESHOLDS and info["price_num"] < float(THRESHOLDS[m])
+        and _is_new_low(m, info["price_num"], delta_step)
+    }
+
 def check_and_notify(
     df: pd.DataFrame,
     delta_step: float = 1.0,
     force_send: bool = False,
     verbose: bool = True,
+    dry_run: bool = False,
 ) -> dict:
     """
     - 仅在 in_stock=True 的条目里找最低价并比较阈值
     - 严格“小于”阈值才触发
     - 去重：同一型号只有当比上次通知价更低 >= delta_step 才再次发；force_send=True 强制发
+    - ALERT_ASYNC 时邮件只进 outbox（落盘即视为已提交，后台重试到发出为止）
+    - dry_run=True 只判定、返回会触发的型号，不发信也不更新去重状态（离线/回放用）
     """
     # 基础校验
     need_cols = {"model", "price_num", "in_stock"}
@@ -124,7 +192,6 @@ def check_and_notify(
     if verbose:
         print("[ALERT] 当前最低价（仅有货）：", {k: v["price_num"] for k, v in current_best.items()})
 
-    state = _load_state()
     triggered = {}
 
     for model, limit in THRESHOLDS.items():
@@ -144,15 +211,14 @@ def check_and_notify(
                 triggered[model] = info
                 if verbose:
                     print(f"[ALERT] {model}: 触发（force_send=True）。")
+            elif _is_new_low(model, p, delta_step):
+                triggered[model] = info
+                if verbose:
+                    print(f"[ALERT] {model}: £{p:.2f} < 阈值 £{float(limit):.2f}，且较上次更低（或首次）。")
             else:
-                last = state.get(model, {}).get("last_notified_price")
-                if last is None or p <= float(last) - float(delta_step):
-                    triggered[model] = info
-                    if verbose:
-                        print(f"[ALERT] {model}: £{p:.2f} < 阈值 £{float(limit):.2f}，且较上次更低（或首次）。")
-                else:
-                    if verbose:
-                        print(f"[ALERT] {model}: 已低于阈值但未更低（last={last}); 跳过。")
+                if verbose:
+                    last = ALERT_STATE.get(model).get("last_notified_price")
+                    print(f"[ALERT] {model}: 已低于阈值但未更低（last={last}); 跳过。")
         else:
             if verbose:
                 print(f"[ALERT] {model}: 未触发（£{p:.2f} ≥ £{float(limit):.2f}）。")
@@ -161,25 +227,6 @@ def check_and_notify(
         if verbose:
             print("[ALERT] 本次无触发。")
         return {}
-
-    # 发送邮件
-    try:
-        subject = _build_email_subject(triggered)
-        html = _build_email_html(triggered)
-        _send_email(subject, html)
-        if verbose:
-            print("[ALERT] 邮件已发送。")
-    except Exception as e:
-        print(f"[ALERT][ERROR] 发送邮件失败：{e}")
-        return {}
-
-    # 更新去重状态（只在成功发送后）
-    for m, info in triggered.items():
-        state[m] = {
-            "last_notified_price": info["price_num"],
-            "last_site": info["site"],
-            "last_url": info["url"],
-            "ts": datetime.now().isoformat(timespec="seconds"),
-        }
-    _save_state(state)
-    return triggered
+    if dry_run:
+        return triggered
+    return triggered if _deliver(triggered, verbose) else {}
@@ -0,0 +1,79 @@
+# utils/observation.py
+from __future__ import annotations
+import re
+import sys
+import math
+from dataclasses import dataclass
+
+PRICE_RE = re.compile(r"[\d,.]+")
+
+# 与 DataFrame 的列顺序一致（见 utils.report.normalize_frame）
+COLUMNS = ("site", "model", "price", "title", "url", "in_stock", "price_num")
+
+
+def parse_price(x) -> float | None:
+    """"£1,299.00" -> 1299.0；数值直接用；字符串取第一段数字（去千分位）；解析不了返回 None。"""
+    if x is None or (isinstance(x, float) and math.isnan(x)):
+        return None
+    if isinstance(x, (int, float)):
+        return float(x)
+    m = PRICE_RE.search(str(x))
+    if not m:
+        return None
+    try:
+        return float(m.group(0).replace(",", ""))
+    except ValueError:
+        return None
+
+
+@dataclass(slots=True)
+class PriceObservation:
+    """
+    一条价格观测，从 scraper 一路传到报告/历史/告警，不再来回拷 dict：
+    - __slots__，没有每条一个 __dict__
+    - site/model 用 sys.intern，10 万条也只有几份字符串
+    - price_num 在产生时解析一次，下游（报告、告警、调度）直接用
+    """
+    site: str
+    model: str
+    price: str | None
+    title: str | None
+    url: str | None
+    in_stock: bool
+    price_num: float | None
+
+    @classmethod
+    def make(cls, site: str, model: str, price, title: str | None, url: str | None,
+             in_stock) -> "PriceObservation":
+        return cls(sys.intern(str(site)), sys.intern(str(model)),
+                   None if price is None else str(price), title, url, bool(in_stock), parse_price(price))
+
+    @classmethod
+    def from_dict(cls, d: dict, site: str | None = None, model: str | None = None) -> "PriceObservation":
+        """旧式行 dict -> 观测；site/model 给了就以它为准（调度里的站点名）。"""
+        return cls.make(site or d.get("site"), d.get("model") or model, d.get("price"),
+                        d.get("title"), d.get("url"), d.get("in_stock"))
+
+    def as_dict(self) -> dict:
+        return {c: getattr(self, c) for c in COLUMNS}
+
+    def get(self, key: str, default=None):
+        """按 dict 的方式读字段，给还在用 row.get(...) 的代码。"""
+        return getattr(self, key, default)
+
+
+def dedupe(rows: list[PriceObservation]) -> list[PriceObservation]:
+    """按 (site, url) 去重，保留第一条（与 DataFrame.drop_duplicates(keep="first") 一致）。"""
+    seen = set()
+    out = []
+    for r in rows:
+        key = (r.site, r.url)
+        if key not in seen:
+            seen.add(key)
+            out.append(r)
+    return out
+
+
+def to_columns(rows: list[PriceObservation]) -> dict[str, list]:
+    """按列拆开，直接喂给 pd.DataFrame，不经过每行一个 dict。"""
+    return {c: [getattr(r, c) for r in rows] for c in COLUMNS}
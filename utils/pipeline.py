@@ -0,0 +1,202 @@
+# utils/pipeline.py
+from __future__ import annotations
+import os
+import time
+import queue
+import atexit
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.metrics import METRICS
+from utils.observation import PriceObservation
+from utils.deadline import DeadlineExceeded
+
+# 解析进程数（默认 = CPU 核数）和两段之间队列的长度（抓完待解析的页面最多积压这么多）
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", 0)) or os.cpu_count() or 1
+QUEUE_SIZE = 2 * PARSE_WORKERS
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def parse_pool() -> ProcessPoolExecutor:
+    """
+    解析进程池，第一次用时创建，进程常驻（--loop）时跨轮次复用。
+    用 forkserver/spawn 而不是 fork：主进程里已有抓取线程和锁，fork 出来的子进程可能卡死。
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _POOL = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=ctx)
+            atexit.register(_POOL.shutdown, wait=False, cancel_futures=True)
+        return _POOL
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """子进程被杀（OOM 等）后进程池就一直是坏的：丢掉它，下次 parse_pool() 重建。"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit_parse(module: str, page: dict):
+    """交给解析进程池，返回 (pool, future)；池子已经坏了就重建一次再交。"""
+    pool = parse_pool()
+    try:
+        return pool, pool.submit(_parse_worker, module, page)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        pool = parse_pool()
+        return pool, pool.submit(_parse_worker, module, page)
+
+
+def _parse_worker(module: str, page: dict):
+    """在子进程里跑：返回 (parsed, 解析耗时)；耗时由主进程记到 METRICS。"""
+    t0 = time.perf_counter()
+    parsed = importlib.import_module(module).parse(page)
+    return parsed, time.perf_counter() - t0
+
+
+def _ignore(job, rows):
+    pass
+
+
+def run_pipeline(tasks: dict[str, list[str]], modules: dict[str, str], concurrency: dict[str, int],
+                 on_result=_ignore) -> dict[tuple[str, str], list[PriceObservation] | None]:
+    """
+    两段流水线：
+      1. I/O：每个站点一个线程池（大小 = concurrency[site]）执行 module.fetch(page)，
+         抓到的页面放进有界队列；队列满了抓取线程就等（背压）
+      2. CPU：主线程从队列取页面，交给解析进程池执行 module.parse(page)，
+         在途的解析任务也有上限；解析完在主进程里 module.finish(page, parsed) 组装行
+    抓取和解析同时进行。304 复用了旧解析结果的页面不进进程池。
+
+    tasks: {site: [model, ...]}；modules: {site: "scrapers.lg"}，模块需提供 plan/fetch/parse/finish。
+    on_result(job, rows) 在主线程里、每个目标一出结果就回调。
+    返回 {(site, model): rows | None}，None 表示失败；本轮预算用完没抓的目标不在结果里。
+    """
+    results: dict[tuple[str, str], list[PriceObservation] | None] = {}
+
+    def emit(job: tuple[str, str], rows: list[PriceObservation] | None):
+        results[job] = rows
+        on_result(job, rows)
+
+    pages: list[tuple[str, dict]] = []
+    for site, models in tasks.items():
+        mod = importlib.import_module(modules[site])
+        planned = mod.plan(models)
+        covered = {m for p in planned for m in p["models"]}
+        for m in models:
+            if m not in covered:
+                emit((site, m), [])                # 目录里该站点没有这个型号，与 scrape() 返回 [] 一致
+        pages += [(site, p) for p in planned]
+    if not pages:
+        return results
+
+    fetched: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()                       # 主线程提前退出（出错/中断）时置位
+
+    def put(item):
+        # 不无限期阻塞：主线程不再取的时候，满队列会让抓取线程永远等下去，shutdown 跟着卡死
+        while not stop.is_set():
+            try:
+                fetched.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def fetch_one(site: str, page: dict):
+        if stop.is_set():
+            return
+        try:
+            put((site, importlib.import_module(modules[site]).fetch(page), None))
+        except Exception as e:
+            put((site, page, e))
+
+    def fail(site: str, page: dict, stage: str, e: Exception):
+        print(f"[{site}] {stage} {', '.join(page['models'])} failed: {e}")
+        for m in page["models"]:
+            emit((site, m), None)
+
+    def finish(site: str, page: dict, parsed):
+        try:
+            out = importlib.import_module(modules[site]).finish(page, parsed)
+        except Exception as e:
+            fail(site, page, "finish", e)
+            return
+        for m, rows in out.items():
+            emit((site, m), rows)
+
+    in_flight = threading.BoundedSemaphore(QUEUE_SIZE)
+    parsing: list[tuple[str, dict, ProcessPoolExecutor, object]] = []
+
+    def drain(block: bool):
+        still = []
+        for site, page, pool, fut in parsing:
+            if not block and not fut.done():
+                still.append((site, page, pool, fut))
+                continue
+            try:
+                parsed, seconds = fut.result()
+            except BrokenProcessPool as e:
+                _discard_pool(pool)                # 后面的页面用新池子解析
+                fail(site, page, "parse", e)
+                continue
+            except Exception as e:
+                fail(site, page, "parse", e)
+                continue
+            finally:
+                # 页面已交给子进程，主进程不再持有；要等 result() 之后再清：
+                # 提交只是排队，真正 pickle 发给子进程是在后台线程里，提前清掉子进程就拿到空页面
+                page["html"] = None
+            METRICS.observe("parse_seconds", seconds, site=site)
+            finish(site, page, parsed)
+        parsing[:] = still
+
+    fetchers = {site: ThreadPoolExecutor(max_workers=max(1, concurrency.get(site, 1)),
+                                         thread_name_prefix=f"fetch-{site}")
+                for site in tasks}
+    try:
+        for site, page in pages:
+            fetchers[site].submit(fetch_one, site, page)
+
+        for _ in range(len(pages)):
+            site, page, err = fetched.get()
+            if isinstance(err, DeadlineExceeded):
+                continue
+            if err is not None:
+                fail(site, page, "fetch", err)
+                continue
+            if page.get("parsed") is not None:
+                finish(site, page, page["parsed"])
+                continue
+            in_flight.acquire()                    # 解析积压太多时先别从队列取，抓取线程随之停下
+            try:
+                pool, fut = _submit_parse(modules[site], page)
+            except Exception as e:
+                in_flight.release()                # 没交出去，名额不能占着
+                fail(site, page, "parse", e)
+                continue
+            fut.add_done_callback(lambda _: in_flight.release())
+            parsing.append((site, page, pool, fut))
+            drain(block=False)
+        drain(block=True)
+    finally:
+        stop.set()
+        for ex in fetchers.values():
+            ex.shutdown(wait=False, cancel_futures=True)
+        while True:                                # 腾出队列，正卡在 put 上的抓取线程马上返回
+            try:
+                fetched.get_nowait()
+            except queue.Empty:
+                break
+        for ex in fetchers.values():
+            ex.shutdown(wait=True)
+    return results
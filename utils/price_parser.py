@@ -16,9 +16,4 @@ def extract_price_from_node(node: Tag):
         f = (frac.get_text(strip=True) if frac else "00")
         if w.isdigit():
             return f"£{w}.{f}"
-    off2 = node.select_one("span.a-price span.a-offscreen")
-    if off2:
-        txt = off2.get_text(strip=True)
-        if txt and not RRP_PAT.search(txt):
-            return txt
     return None
@@ -0,0 +1,55 @@
+# utils/product_pages.py
+from __future__ import annotations
+
+from utils.session import SESSION_POOL, cached_get
+from utils.http_cache import HTTP_CACHE
+from utils.metrics import METRICS
+from utils.catalog import CATALOG
+
+
+class ProductPages:
+    """
+    目录里每个型号一条固定链接的站点（LG、Smiths）共用的流水线阶段（见 utils.pipeline）：
+    - plan()：目录里有链接的型号各一页，不发请求
+    - fetch()：条件 GET；304 时带上同一解析器版本上次的解析结果（parsed），不用再解析
+    - remember()：finish 里调用，记下新的解析结果供 304 复用
+    - scrape()：串行/并发模式下单个型号走一遍 plan -> fetch -> parse -> finish
+    站点模块只写自己的 parse（纯 CPU）和 finish（组装行）。
+    """
+
+    def __init__(self, site: str, parser_version: int):
+        self.site = site                        # config.PRODUCTS 里的站点名
+        self.parser_version = parser_version
+
+    def plan(self, models: list[str]) -> list[dict]:
+        pages = []
+        for model in models:
+            target = CATALOG.target(self.site, model)
+            if target:
+                pages.append({"site": self.site, "models": [model], "url": target["url"],
+                              "key": CATALOG.resolve(model)})
+        return pages
+
+    def fetch(self, page: dict) -> dict:
+        url = page["url"]
+        with SESSION_POOL.borrow(url) as session:
+            html, not_modified = cached_get(session, url, HTTP_CACHE)
+        page["parsed"] = HTTP_CACHE.parsed(url, self.parser_version) if not_modified else None
+        page["html"] = None if page["parsed"] else html
+        return page
+
+    def remember(self, page: dict, parsed):
+        if page["parsed"] is None:
+            HTTP_CACHE.save_parsed(page["url"], parsed, self.parser_version)
+
+    def scrape(self, model: str, parse, finish) -> list:
+        """目录里没有该型号的链接时返回 []。"""
+        pages = self.plan([model])
+        if not pages:
+            return []
+        page = self.fetch(pages[0])
+        parsed = page["parsed"]
+        if parsed is None:
+            with METRICS.timed("parse_seconds", site=self.site):
+                parsed = parse(page)
+        return finish(page, parsed)[model]
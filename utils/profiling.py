@@ -0,0 +1,101 @@
+# utils/profiling.py
+from __future__ import annotations
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from pathlib import Path
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_DIR = Path("reports/profiles")
+TOP_N = 30
+SAMPLE_INTERVAL_SEC = 0.005
+
+
+class StackSampler(threading.Thread):
+    """
+    定时采样所有线程的调用栈，累计成 flamegraph.pl / speedscope 能读的 collapsed 格式：
+    "线程;模块:函数;模块:函数 次数"。cProfile 只看得到主线程，并发抓取时靠它补全。
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SEC):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._done.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                    frame = frame.f_back
+                parts.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(parts))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+@contextmanager
+def profiled(outdir: Path = PROFILE_DIR, top_n: int = TOP_N):
+    """
+    在 cProfile + tracemalloc + 栈采样下执行一段代码，结束后写出：
+    - <stamp>.pstats      cProfile 原始数据（snakeviz / pstats 可读）
+    - <stamp>.txt         按累计耗时排序的前 top_n 个函数
+    - <stamp>.alloc.txt   tracemalloc 分配最多的前 top_n 行 + 峰值
+    - <stamp>.collapsed   collapsed stacks（flamegraph.pl / speedscope）
+    yield 一个 dict，退出后里面是各文件路径。
+    """
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    paths: dict[str, Path] = {}
+
+    tracemalloc.start(25)
+    sampler = StackSampler()
+    sampler.start()
+    prof = cProfile.Profile()
+    t0 = time.perf_counter()
+    prof.enable()
+    try:
+        yield paths
+    finally:
+        prof.disable()
+        wall = time.perf_counter() - t0
+        sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        paths["pstats"] = outdir / f"{stamp}.pstats"
+        prof.dump_stats(paths["pstats"])
+
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(top_n)
+        paths["text"] = outdir / f"{stamp}.txt"
+        paths["text"].write_text(f"wall: {wall:.3f}s\n\n" + buf.getvalue(), encoding="utf-8")
+
+        lines = [f"peak traced memory: {peak / 1024 / 1024:.1f} MiB", ""]
+        for stat in snapshot.statistics("lineno")[:top_n]:
+            lines.append(str(stat))
+        paths["alloc"] = outdir / f"{stamp}.alloc.txt"
+        paths["alloc"].write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        paths["collapsed"] = outdir / f"{stamp}.collapsed"
+        paths["collapsed"].write_text(sampler.collapsed(), encoding="utf-8")
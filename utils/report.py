@@ -2,52 +2,110 @@ from __future__ import annotations
 from datetime import datetime
 from pathlib import Path
 
-import re
-import math
+import json
+import hashlib
 import pandas as pd
 
-PRICE_RE = re.compile(r"[\d,.]+")
+from utils.observation import PriceObservation, dedupe, to_columns
 
-def _to_num(x):
-    if x is None or (isinstance(x, float) and math.isnan(x)):
-        return None
-    if isinstance(x, (int, float)): 
-        return float(x)
-    m = PRICE_RE.search(str(x))
-    return float(m.group(0).replace(",", "")) if m else None
+SNAPSHOT_FILE = ".snapshot.json"      # 上一轮快照的按型号摘要（放在 outdir 下）
+HEARTBEAT_FILE = "heartbeat.log"
 
-def render_and_save(results: list[dict], outdir: str = "reports") -> pd.DataFrame:
+def normalize_frame(results: list[PriceObservation]) -> pd.DataFrame:
     """
-    results: [{'site':..., 'model':..., 'price':..., 'title':..., 'url':..., 'in_stock':...}, ...]
+    统一的 DataFrame 规范化：先按 (site, url) 去重，再按列一次建表（不经过每行一个 dict），
+    price_num 直接用观测里解析好的，site/model 是 category（排序结果与字符串一致，内存更小）。
+    旧式 dict 行会先转成 PriceObservation。
+    """
+    rows = dedupe([r if isinstance(r, PriceObservation) else PriceObservation.from_dict(r) for r in results])
+    cols = to_columns(rows)
+    return pd.DataFrame({
+        "site": pd.Categorical(cols["site"]),
+        "model": pd.Categorical(cols["model"]),
+        "price": cols["price"],
+        "title": cols["title"],
+        "url": cols["url"],
+        "in_stock": cols["in_stock"],
+        "price_num": pd.Series(cols["price_num"], dtype="float64"),
+    })
+
+def best_index(df: pd.DataFrame, in_stock_only: bool = False) -> pd.Index:
+    """每个型号最低价所在行的索引（idxmin，不排序整表）；report 和 notify 共用。"""
+    mask = df["price_num"].notna()
+    if in_stock_only:
+        mask &= df["in_stock"].fillna(False).astype(bool)
+    if not mask.any():
+        return df.index[:0]
+    return pd.Index(df.loc[mask].groupby("model", observed=True)["price_num"].idxmin())
+
+def snapshot_digests(results: list[PriceObservation]) -> dict[str, str]:
+    """
+    规范化快照并按型号算内容哈希：{model: sha1}。
+    与 render_and_save 一样按 (site, url) 去重，排序后再哈希，和抓取顺序无关。
+    """
+    seen = set()
+    per_model: dict[str, list] = {}
+    for r in results:
+        key = (r.site, r.url)
+        if key in seen:
+            continue
+        seen.add(key)
+        per_model.setdefault(r.model, []).append([
+            r.site, str(r.url), str(r.price), r.in_stock, str(r.title),
+        ])
+    return {
+        m: hashlib.sha1(json.dumps(sorted(v), ensure_ascii=False).encode("utf-8")).hexdigest()
+        for m, v in per_model.items()
+    }
+
+def load_snapshot(outdir: str = "reports") -> dict[str, str]:
+    try:
+        return json.loads((Path(outdir) / SNAPSHOT_FILE).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def save_snapshot(digests: dict[str, str], outdir: str = "reports"):
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    (Path(outdir) / SNAPSHOT_FILE).write_text(json.dumps(digests), encoding="utf-8")
+
+def changed_models(digests: dict[str, str], previous: dict[str, str]) -> set[str]:
+    """新增、消失或内容变化的型号。空集合表示整份快照未变。"""
+    return {m for m in digests.keys() | previous.keys() if digests.get(m) != previous.get(m)}
+
+def append_heartbeat(n_rows: int, outdir: str = "reports"):
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(Path(outdir) / HEARTBEAT_FILE, "a", encoding="utf-8") as f:
+        f.write(f"{stamp}\tunchanged\trows={n_rows}\n")
+
+def render_and_save(results: list[PriceObservation], outdir: str = "reports",
+                    changed: set[str] | None = None, stamp: str | None = None) -> pd.DataFrame:
+    """
+    results: [PriceObservation, ...]（旧式行 dict 也可以）
     - 整理为 DataFrame
     - 价格转数字、按 model/site 排序
     - 标注每个 model 的最低价(best=True)
     - 导出 CSV 和自包含 HTML(可直接双击查看)
-    - 终端打印一个紧凑表（如果安装了 rich 则彩色高亮）
+    - 终端打印一个紧凑表（如果安装了 rich 则彩色高亮）；给了 changed 时只打印这些型号
+    - 文件名默认按当前时间（到秒）；stamp 给了就用它（回放时用存档的轮次）
     """
     if not results:
         print("No results.")
         return pd.DataFrame()
 
-    df = pd.DataFrame(results, columns=["site", "model", "price", "title", "url", "in_stock"])
-
-    # 价格转数值，便于排序/比较
-    df["price_num"] = df["price"].map(_to_num)
-
-    # 去掉完全重复的行（同站点同链接）
-    df = df.drop_duplicates(subset=["site", "url"], keep="first")
+    # 价格转数值、去掉完全重复的行（同站点同链接）
+    df = normalize_frame(results)
 
     # 标注每个型号的最低价
-    best_idx = df.sort_values("price_num", na_position="last").groupby("model", as_index=False).first().index
     df["best"] = False
-    df.loc[best_idx, "best"] = True
+    df.loc[best_index(df), "best"] = True
 
     # 排序：型号 -> 价格 -> 站点
     df = df.sort_values(["model", "price_num", "site"], na_position="last").reset_index(drop=True)
 
     # 输出目录和文件名
     Path(outdir).mkdir(parents=True, exist_ok=True)
-    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    stamp = stamp or datetime.now().strftime("%Y%m%d-%H%M%S")
     csv_path = Path(outdir) / f"tv_prices_{stamp}.csv"
     html_path = Path(outdir) / f"tv_prices_{stamp}.html"
 
@@ -68,6 +126,7 @@ def render_and_save(results: list[dict], outdir: str = "reports") -> pd.DataFram
     styled.to_html(html_path, doctype_html=True)
 
     # 终端展示（有 rich 用彩色；没有就普通表）
+    view = df if changed is None else df[df["model"].isin(changed)]
     try:
         from rich.console import Console
         from rich.table import Table
@@ -78,14 +137,16 @@ def render_and_save(results: list[dict], outdir: str = "reports") -> pd.DataFram
         for col in ["model", "site", "price", "in_stock", "title", "url"]:
             table.add_column(col, overflow="fold")
 
-        for _, r in df.drop(columns=["price_num"]).iterrows():
+        for _, r in view.drop(columns=["price_num"]).iterrows():
             price_text = f"[bold green]{r.price}[/]" if r.get("best") else str(r.price)
             stock_text = "✅" if r.in_stock else "❌"
             table.add_row(str(r.model), str(r.site), price_text, stock_text, str(r.title), str(r.url))
         console.print(table)
     except Exception:
         # 退化为普通打印
-        print(df.drop(columns=["price_num"]).to_string(index=False))
+        print(view.drop(columns=["price_num"]).to_string(index=False))
+    if changed is not None and len(view) < len(df):
+        print(f"（{df['model'].nunique() - view['model'].nunique()} 个型号无变化，未显示）")
 
     print(f"\nSaved CSV -> {csv_path}")
     print(f"Saved HTML -> {html_path} (双击即可查看)")
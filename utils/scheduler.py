@@ -0,0 +1,110 @@
+# utils/scheduler.py
+from __future__ import annotations
+import heapq
+import itertools
+from collections import deque
+
+from utils.observation import PriceObservation
+
+MIN_INTERVAL_SEC = 5 * 60           # 价格刚变 / 已低于阈值时的轮询间隔
+BASE_INTERVAL_SEC = 20 * 60         # 初始间隔（与原固定间隔一致）
+MAX_INTERVAL_SEC = 4 * 3600         # 长期不变的目标最多退到这么久
+BACKOFF = 1.5                       # 未变化时间隔乘数
+NEAR_PCT = 0.10                     # 最低价在阈值 +10% 以内算“接近阈值”
+REQUEST_BUDGET_PER_HOUR = 120
+
+
+class AdaptiveScheduler:
+    """
+    按 (site, model) 目标各自安排下次轮询的优先队列：
+    - 价格/库存刚变化 -> 间隔回到 MIN_INTERVAL_SEC
+    - 有货最低价低于或接近 THRESHOLDS -> 间隔减半（不低于 MIN）
+    - 未变化 -> 间隔 × BACKOFF；离阈值很远或该站点没货/没这个型号 -> 退避更快
+    - 全局每小时 HTTP 请求预算：滑动窗口计数，超出的目标顺延。
+      按实际发出的请求记账（charge()），不按目标数：Amazon 一次搜索服务多个型号，
+      LG/Smiths 可能要先访问首页
+    """
+
+    def __init__(self, targets: list[tuple[str, str]], thresholds: dict[str, float],
+                 budget_per_hour: int = REQUEST_BUDGET_PER_HOUR,
+                 min_interval: float = MIN_INTERVAL_SEC, base_interval: float = BASE_INTERVAL_SEC,
+                 max_interval: float = MAX_INTERVAL_SEC, now: float = 0.0):
+        self.thresholds = thresholds
+        self.budget_per_hour = budget_per_hour
+        self.min_interval, self.max_interval = min_interval, max_interval
+        self._seq = itertools.count()
+        self._heap: list[tuple[float, int, tuple[str, str]]] = []
+        self._interval = {t: base_interval for t in targets}
+        self._last_sig: dict[tuple[str, str], tuple | None] = {}
+        self._issued: deque[float] = deque()       # 最近一小时已发出的轮询时间戳
+        for t in targets:
+            heapq.heappush(self._heap, (now, next(self._seq), t))
+
+    def _budget_left(self, now: float) -> int:
+        while self._issued and now - self._issued[0] >= 3600:
+            self._issued.popleft()
+        return self.budget_per_hour - len(self._issued)
+
+    def due(self, now: float) -> list[tuple[str, str]]:
+        """
+        弹出到期目标，个数不超过剩余预算（每个目标至少要一个请求）。
+        调用方抓完后对每个目标调用 record() / defer() / skip()，并用 charge() 记上实际请求数。
+        """
+        out = []
+        left = self._budget_left(now)
+        while self._heap and self._heap[0][0] <= now and left > 0:
+            _, _, target = heapq.heappop(self._heap)
+            out.append(target)
+            left -= 1
+        return out
+
+    def charge(self, requests: int, now: float):
+        """记上本次轮询实际发出的 HTTP 请求数。"""
+        self._issued.extend([now] * max(0, int(requests)))
+
+    def seconds_until_next(self, now: float) -> float:
+        if not self._heap:
+            return self.max_interval
+        wait = self._heap[0][0] - now
+        if self._budget_left(now) <= 0 and self._issued:
+            wait = max(wait, self._issued[0] + 3600 - now)
+        return max(0.0, wait)
+
+    def _best_in_stock(self, rows: list[PriceObservation]) -> float | None:
+        prices = [r.price_num for r in rows if r.in_stock and r.price_num is not None]
+        return min(prices) if prices else None
+
+    def defer(self, target: tuple[str, str], now: float):
+        """目标这次没轮到抓（比如本轮时间预算用完）：间隔不变，立即重新入队。"""
+        heapq.heappush(self._heap, (now, next(self._seq), target))
+
+    def skip(self, target: tuple[str, str], now: float):
+        """这次没有抓（比如另一个实例正拿着锁）：不算失败，按原间隔顺延。"""
+        heapq.heappush(self._heap, (now + self._interval.get(target, BASE_INTERVAL_SEC), next(self._seq), target))
+
+    def record(self, target: tuple[str, str], rows: list[PriceObservation] | None, now: float) -> float:
+        """登记一次轮询结果（rows=None 表示失败），重新入队，返回新间隔。"""
+        site, model = target
+        interval = self._interval.get(target, BASE_INTERVAL_SEC)
+
+        if rows is None:
+            interval = min(self.max_interval, interval * BACKOFF)
+        else:
+            sig = tuple(sorted((str(r.url), str(r.price), r.in_stock) for r in rows))
+            prev = self._last_sig.get(target)
+            self._last_sig[target] = sig
+            best = self._best_in_stock(rows)
+            limit = self.thresholds.get(model)
+
+            if prev is not None and sig != prev:
+                interval = self.min_interval
+            elif best is not None and limit is not None and best <= float(limit) * (1 + NEAR_PCT):
+                interval = max(self.min_interval, interval / 2)
+            elif best is None or limit is None:
+                interval = min(self.max_interval, interval * BACKOFF * BACKOFF)
+            else:
+                interval = min(self.max_interval, interval * BACKOFF)
+
+        self._interval[target] = interval
+        heapq.heappush(self._heap, (now + interval, next(self._seq), target))
+        return interval
@@ -1,9 +1,18 @@
+import json
 import random
+import threading
 import requests
+from pathlib import Path
+from contextlib import contextmanager
+from urllib.parse import urlparse
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import time
 
+from utils.metrics import METRICS
+from utils.deadline import DeadlineExceeded, time_left, check_deadline
+from utils.circuit import BREAKERS, CircuitOpen, FAILURE_STATUSES, parse_retry_after
+
 UA_POOL = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_6) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.3 Safari/605.1.15",
@@ -20,39 +29,244 @@ DEFAULT_HEADERS = {
     "Connection": "keep-alive",
 }
 
-TIMEOUT = 20
+TIMEOUT = (5, 15)                      # (连接, 读取) 秒；宁可快速失败交给熔断器，也不要一个型号卡几分钟
+
+# 离线模式：设置为 url -> html|None 的函数后，所有请求都从它取，不走网络、不抖动
+_OFFLINE = None
+
+def set_offline(lookup):
+    global _OFFLINE
+    _OFFLINE = lookup
+
+def is_offline() -> bool:
+    return _OFFLINE is not None
+
+def fixture_lookup(manifest: str | Path):
+    """
+    读取 {url: 文件名} 清单（文件名相对清单所在目录），返回给 set_offline 用的取数函数。
+    例如 bench/fixtures/urls.json。
+    """
+    manifest = Path(manifest)
+    mapping = json.loads(manifest.read_text(encoding="utf-8"))
+
+    def lookup(url: str):
+        name = mapping.get(url)
+        return (manifest.parent / name).read_text(encoding="utf-8") if name else None
+    return lookup
+
+# 录制：设置为 (url, html) 回调后，safe_get/cached_get 拿到的每个正文（含 304 时的缓存正文）都交给它，
+# 供之后 --replay 离线重放（见 utils.archive）
+_RECORDER = None
+
+def set_recorder(record):
+    global _RECORDER
+    _RECORDER = record
 
-def build_session() -> requests.Session:
+def is_recording() -> bool:
+    return _RECORDER is not None
+
+def _record(url: str, body: str):
+    if _RECORDER is None or _OFFLINE is not None:
+        return
+    try:
+        _RECORDER(url, body)
+    except Exception as e:
+        METRICS.inc("archive_errors_total")
+        print(f"[archive] record {url} failed: {e}")
+
+def _offline_response(url: str) -> requests.Response:
+    body = _OFFLINE(url)
+    r = requests.Response()
+    r.url = url
+    r.status_code = 200 if body is not None else 404
+    r.encoding = "utf-8"
+    r._content = (body or "").encode("utf-8")
+    return r
+
+# 会话池：同一 host 复用连接/cookie，超过 SESSION_MAX_AGE_SEC 后换新 UA 和 cookie
+SESSION_MAX_AGE_SEC = 30 * 60
+POOL_MAXSIZE = 4
+
+def build_session(pool_maxsize: int = POOL_MAXSIZE) -> requests.Session:
     s = requests.Session()
     headers = DEFAULT_HEADERS.copy()
     headers["User-Agent"] = random.choice(UA_POOL)
     s.headers.update(headers)
 
+    # 只做少量快速重试；Retry-After 不在这里睡，而是交给 utils.circuit 让整个 host 冷却。
+    # 可能带 Retry-After 的状态（429/503）不重试：第一次就交给熔断器，不然会无视服务器要求立刻再打几次。
+    # raise_on_status=False：重试用完后拿到最后的响应，由调用方 raise_for_status
     retry = Retry(
-        total=5, connect=3, read=3,
-        backoff_factor=1.5,
-        status_forcelist=[429, 500, 502, 503, 504],
+        total=2, connect=2, read=1,
+        backoff_factor=0.5,
+        status_forcelist=sorted(FAILURE_STATUSES - Retry.RETRY_AFTER_STATUS_CODES),
         allowed_methods=["HEAD", "GET", "OPTIONS"],
-        raise_on_status=True,
+        respect_retry_after_header=False,
+        raise_on_status=False,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
     s.mount("https://", adapter)
     s.mount("http://", adapter)
     return s
 
 def jitter_sleep(a=0.7, b=1.6):
-    time.sleep(random.uniform(a, b))
+    if _OFFLINE is not None:
+        return
+    d = random.uniform(a, b)
+    left = time_left()
+    if left is not None:
+        d = min(d, max(0.0, left))          # 抖动也算进本轮预算，不睡过截止时间
+    METRICS.observe("jitter_sleep_seconds", d)
+    time.sleep(d)
+
+def _timeout():
+    """TIMEOUT 与本轮剩余时间取小。"""
+    left = time_left()
+    if left is None:
+        return TIMEOUT
+    return tuple(min(t, max(left, 0.1)) for t in TIMEOUT)
+
+@contextmanager
+def _guard(host: str):
+    """
+    本轮还有时间、熔断器也放行才进入；否则抛 DeadlineExceeded / CircuitOpen（不发请求、不抖动）。
+    先看截止时间再占 half_open 的探测名额；退出时如果没记下成功/失败（抖动中到了截止时间、
+    请求被截断等），交还名额，否则这个 host 之后每一轮都会被拒绝。
+    """
+    check_deadline()
+    try:
+        BREAKERS.before(host)
+    except CircuitOpen:
+        METRICS.inc("circuit_rejections_total", host=host)
+        raise
+    try:
+        yield
+    finally:
+        BREAKERS.release(host)                # 已记过成功/失败时名额早已清空，这里什么都不做
+
+def _get(s: requests.Session, url: str, **kw) -> requests.Response:
+    """带埋点和熔断的 GET：耗时、状态码、下载字节数、urllib3 重试次数（按 host 统计）。"""
+    host = host_of(url)
+    with _guard(host):
+        t0 = time.perf_counter()
+        try:
+            r = _offline_response(url) if _OFFLINE is not None else s.get(url, timeout=_timeout(), **kw)
+        except Exception as e:
+            METRICS.observe("http_request_seconds", time.perf_counter() - t0, host=host)
+            left = time_left()
+            if left is not None and left <= 0:
+                # 是被截止时间截断的，不算 host 的错（探测名额由 _guard 交还）
+                raise DeadlineExceeded(f"{url} cut off by cycle deadline") from e
+            METRICS.inc("http_errors_total", host=host)
+            BREAKERS.failure(host, type(e).__name__)
+            raise
+        METRICS.observe("http_request_seconds", time.perf_counter() - t0, host=host)
+        METRICS.inc("http_requests_total", host=host, status=r.status_code)
+        METRICS.inc("http_bytes_total", len(r.content), host=host)
+        retries = getattr(getattr(r.raw, "retries", None), "history", None)
+        if retries:
+            METRICS.inc("http_retries_total", len(retries), host=host)
+        if r.status_code in FAILURE_STATUSES:
+            BREAKERS.failure(host, f"HTTP {r.status_code}", parse_retry_after(r.headers.get("Retry-After")))
+        else:
+            BREAKERS.success(host)
+        return r
 
-def safe_get(s: requests.Session, url: str) -> str:
-    jitter_sleep()
-    r = s.get(url, timeout=TIMEOUT)
+def safe_get(s: requests.Session, url: str, cache=None) -> str:
+    if cache is not None:
+        return cached_get(s, url, cache)[0]
+    with _guard(host_of(url)):
+        jitter_sleep()
+        r = _get(s, url)
     r.raise_for_status()
+    _record(url, r.text)
     return r.text
 
+def cached_get(s: requests.Session, url: str, cache) -> tuple[str, bool]:
+    """
+    条件 GET：带上缓存里的 ETag / Last-Modified。
+    返回 (html, not_modified)；not_modified=True 表示 304，html 来自磁盘缓存。
+    """
+    if _OFFLINE is not None:
+        return safe_get(s, url), False        # 离线页面不进也不读 HTTP 缓存
+    with _guard(host_of(url)):
+        jitter_sleep()
+        meta = cache.lookup(url)
+        r = _get(s, url, headers=cache.conditional_headers(meta))
+        if r.status_code == 304 and meta:
+            body = cache.load_body(url)
+            if body is not None:
+                cache.revalidated(url, meta)
+                _record(url, body)
+                return body, True
+            # 正文丢了：去掉条件头重新完整下载
+            r = _get(s, url)
+    r.raise_for_status()
+    cache.store(url, r.text, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+    _record(url, r.text)
+    return r.text, False
+
 def prefetch_homepage(s: requests.Session, base_url: str):
     try:
-        s.get(base_url, timeout=TIMEOUT)
+        _get(s, base_url)
         jitter_sleep()
         s.headers["Referer"] = base_url + "/"
     except:
         pass
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class SessionPool:
+    """
+    按 host 缓存空闲的 Session（keep-alive + cookie 复用），线程安全。
+    - borrow() 借出一个会话，用完自动归还；出异常时丢弃，下次重新建
+    - 会话存活超过 max_age 秒后轮换（新 UA、新 cookie jar）
+    - prefetch=True 时只在新会话上访问一次首页，之后复用
+    进程常驻（--loop）时池子跨轮次保留。
+    """
+
+    def __init__(self, max_age: float = SESSION_MAX_AGE_SEC, pool_maxsize: int = POOL_MAXSIZE):
+        self.max_age = max_age
+        self.pool_maxsize = pool_maxsize
+        self._lock = threading.Lock()
+        self._idle: dict[str, list[tuple[requests.Session, float]]] = {}
+
+    def _take(self, host: str):
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(host, [])
+            while idle:
+                s, born = idle.pop()
+                if now - born < self.max_age:
+                    return s, born
+                s.close()
+        return None, now
+
+    @contextmanager
+    def borrow(self, base_url: str, prefetch: bool = False):
+        host = host_of(base_url)
+        s, born = self._take(host)
+        if s is None:
+            s = build_session(self.pool_maxsize)
+            if prefetch:
+                prefetch_homepage(s, base_url)
+        try:
+            yield s
+        except BaseException:
+            s.close()
+            raise
+        with self._lock:
+            self._idle.setdefault(host, []).append((s, born))
+
+    def clear(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for s, _ in idle:
+                    s.close()
+            self._idle.clear()
+
+
+SESSION_POOL = SessionPool()
@@ -0,0 +1,208 @@
+# utils/shards.py
+from __future__ import annotations
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from pathlib import Path
+
+from utils.observation import PriceObservation
+
+# 多个 worker 共用的租约库。同一台机器上放哪都行；多台机器时放在共享目录里，
+# 所以不开 WAL（WAL 依赖同一主机的共享内存），用默认的回滚日志 + busy_timeout 等锁。
+SHARD_DB = Path(os.getenv("SHARD_DB", "reports/shards.sqlite3"))
+LEASE_SEC = 10 * 60                 # 租约有效期；worker 挂了，过期后别的 worker 会接手
+CLAIM_BATCH = 4                     # 每次认领的目标数（同站点的一起认领，Amazon 还能批量搜索）
+POLL_SEC = 5                        # 没活可认领、又有别人的租约没结束时的等待间隔
+KEEP_CYCLES = 200                   # 库里最多保留这么多轮
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shard_cycles (
+    cycle_id TEXT PRIMARY KEY,
+    created  REAL NOT NULL,
+    reporter TEXT                    -- 负责合并报告和告警的 worker，每轮只有一个
+);
+CREATE TABLE IF NOT EXISTS shard_jobs (
+    cycle_id    TEXT    NOT NULL,
+    seq         INTEGER NOT NULL,    -- all_jobs() 里的顺序，合并时按它排
+    site        TEXT    NOT NULL,
+    model       TEXT    NOT NULL,
+    state       TEXT    NOT NULL DEFAULT 'pending',   -- pending | leased | done | failed
+    worker      TEXT,
+    lease_until REAL,
+    rows        TEXT,                -- done 时的行（JSON）
+    PRIMARY KEY (cycle_id, site, model)
+);
+CREATE INDEX IF NOT EXISTS idx_shard_jobs_claim ON shard_jobs(cycle_id, state, lease_until);
+"""
+
+
+def default_worker_id() -> str:
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseStore:
+    """
+    按轮次分发 (site, model) 目标的租约表：
+    - open_cycle() 幂等：同一轮的所有 worker 都调用，目标只插入一次
+    - claim() 在一个写事务里认领一批 pending 或租约已过期的目标，worker 之间不会重叠
+    - complete() 只接受自己仍持有租约的目标（过期后被别人接手的结果丢弃）
+    - try_report() 所有目标都结束后，恰好一个 worker 拿到合并报告的资格
+    """
+
+    def __init__(self, path: Path = SHARD_DB, lease_sec: float = LEASE_SEC):
+        self.path = Path(path)
+        self.lease_sec = lease_sec
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _write(self, fn):
+        """在 BEGIN IMMEDIATE 事务里执行 fn(conn)：一开始就拿写锁，认领不会互相覆盖。"""
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return out
+
+    def open_cycle(self, cycle_id: str, jobs: list[tuple[str, str]]):
+        def fn(conn):
+            conn.execute("INSERT OR IGNORE INTO shard_cycles (cycle_id, created) VALUES (?, ?)",
+                         (cycle_id, time.time()))
+            conn.executemany(
+                "INSERT OR IGNORE INTO shard_jobs (cycle_id, seq, site, model) VALUES (?, ?, ?, ?)",
+                [(cycle_id, i, site, model) for i, (site, model) in enumerate(jobs)],
+            )
+        self._write(fn)
+
+    def claim(self, cycle_id: str, worker: str, limit: int = CLAIM_BATCH) -> list[tuple[str, str]]:
+        """认领最多 limit 个目标，优先和第一个可认领目标同站点的。"""
+        now = time.time()
+
+        def fn(conn):
+            claimable = "cycle_id = ? AND (state = 'pending' OR (state = 'leased' AND lease_until < ?))"
+            first = conn.execute(f"SELECT site FROM shard_jobs WHERE {claimable} ORDER BY seq LIMIT 1",
+                                 (cycle_id, now)).fetchone()
+            if not first:
+                return []
+            rows = conn.execute(
+                f"""
+                UPDATE shard_jobs SET state = 'leased', worker = ?, lease_until = ?
+                WHERE rowid IN (SELECT rowid FROM shard_jobs WHERE {claimable} AND site = ?
+                                ORDER BY seq LIMIT ?)
+                RETURNING seq, site, model
+                """,
+                (worker, now + self.lease_sec, cycle_id, now, first[0], limit),
+            ).fetchall()
+            return [(site, model) for _, site, model in sorted(rows)]
+        return self._write(fn)
+
+    def complete(self, cycle_id: str, worker: str,
+                 results: dict[tuple[str, str], list[PriceObservation] | None]) -> int:
+        """登记结果（rows=None 表示失败），返回被接受的条数。"""
+        def fn(conn):
+            n = 0
+            for (site, model), rows in results.items():
+                cur = conn.execute(
+                    """
+                    UPDATE shard_jobs SET state = ?, rows = ?, lease_until = NULL
+                    WHERE cycle_id = ? AND site = ? AND model = ? AND worker = ? AND state = 'leased'
+                    """,
+                    ("failed" if rows is None else "done",
+                     None if rows is None else json.dumps([r.as_dict() for r in rows], ensure_ascii=False),
+                     cycle_id, site, model, worker),
+                )
+                n += cur.rowcount
+            return n
+        return self._write(fn)
+
+    def release(self, cycle_id: str, worker: str, jobs: list[tuple[str, str]]):
+        """没来得及抓的目标（本轮预算用完）交还给别人。"""
+        def fn(conn):
+            conn.executemany(
+                """
+                UPDATE shard_jobs SET state = 'pending', worker = NULL, lease_until = NULL
+                WHERE cycle_id = ? AND site = ? AND model = ? AND worker = ? AND state = 'leased'
+                """,
+                [(cycle_id, site, model, worker) for site, model in jobs],
+            )
+        self._write(fn)
+
+    def progress(self, cycle_id: str) -> dict[str, int]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT state, COUNT(*) FROM shard_jobs WHERE cycle_id = ? GROUP BY state", (cycle_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def workers(self, cycle_id: str) -> dict[str, int]:
+        """本轮每个 worker 完成的目标数，写进摘要。"""
+        with self._lock:
+            rows = self._db().execute(
+                """SELECT worker, COUNT(*) FROM shard_jobs
+                   WHERE cycle_id = ? AND state IN ('done', 'failed') GROUP BY worker""", (cycle_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def try_report(self, cycle_id: str, worker: str, force: bool = False) -> bool:
+        """
+        没有未过期的租约时，第一个调用的 worker 成为本轮的报告者。
+        force=True（本轮预算用完）不再等别人的租约，没结束的目标按未完成处理。
+        """
+        def fn(conn):
+            busy = not force and conn.execute(
+                "SELECT 1 FROM shard_jobs WHERE cycle_id = ? AND state = 'leased' AND lease_until >= ? LIMIT 1",
+                (cycle_id, time.time()),
+            ).fetchone()
+            if busy:
+                return False
+            cur = conn.execute(
+                "UPDATE shard_cycles SET reporter = ? WHERE cycle_id = ? AND reporter IS NULL",
+                (worker, cycle_id),
+            )
+            return cur.rowcount == 1
+        return self._write(fn)
+
+    def merged(self, cycle_id: str) -> tuple[list[PriceObservation], list[tuple[str, str]]]:
+        """按 all_jobs() 顺序合并所有 worker 的行；另外返回没有结果的目标。"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT site, model, state, rows FROM shard_jobs WHERE cycle_id = ? ORDER BY seq", (cycle_id,)
+            ).fetchall()
+        merged, missing = [], []
+        for site, model, state, data in rows:
+            if state == "done":
+                merged += [PriceObservation.from_dict(d) for d in json.loads(data)]
+            elif state != "failed":
+                missing.append((site, model))
+        return merged, missing
+
+    def prune(self, keep: int = KEEP_CYCLES):
+        def fn(conn):
+            old = "SELECT cycle_id FROM shard_cycles ORDER BY created DESC LIMIT -1 OFFSET ?"
+            conn.execute(f"DELETE FROM shard_jobs WHERE cycle_id IN ({old})", (keep,))
+            conn.execute(f"DELETE FROM shard_cycles WHERE cycle_id IN ({old})", (keep,))
+        self._write(fn)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+SHARDS = LeaseStore()